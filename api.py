@@ -0,0 +1,260 @@
+"""
+JSON API for the Past Paper Vault, for partner sites and bots
+Run this with: python api.py [--host 0.0.0.0] [--port 8000]
+
+    GET /search?q=physics+2021&limit=30   ranked papers, same ranking as the app
+    GET /file/{id}                        the PDF for a File ID returned by /search
+
+Downloads use the bot token in the TELEGRAM_BOT_TOKEN environment variable.
+Responses carry an ETag, so clients revalidate with If-None-Match and get
+304 Not Modified until the master index changes.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from pdfvault.index import load_master_index, fallback_ids, SearchIndex, IndexStore, MASTER_INDEX_CSV
+from pdfvault.search import SearchResultCache
+from pdfvault.shards import ShardedSearch
+from pdfvault.cache import PdfCache, FilePathCache
+from pdfvault.telegram import TelegramClient, RequestScheduler, DOWNLOAD_CHUNK_SIZE
+from pdfvault.downloads import Prefetcher
+
+DEFAULT_LIMIT = 30
+MAX_LIMIT = 100
+SEARCH_MAX_AGE = 60  # Seconds a search response may be reused without revalidating
+FILE_MAX_AGE = 7 * 24 * 60 * 60  # A File ID always names the same file
+RESPONSE_CACHE_SIZE = 2048  # Encoded search responses kept for the current index
+
+logger = logging.getLogger(__name__)
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match header lists ``etag``."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    return '*' in tags or etag in tags
+
+
+def error_response(status_code, message):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+class SearchService:
+    """The API endpoints, over the same index, caches and download path as the app.
+
+    Repeated searches are answered from already encoded responses, and
+    clients holding a current ETag get a 304 without a search at all; both
+    are keyed on the index version, so a reloaded index invalidates them.
+    Searches that miss and downloads run on the thread pool, keeping the
+    event loop free for cached responses.
+
+    With ``shards``, searches run on a ShardedSearch over that many worker
+    processes. It is built in the background for each new index version and
+    swapped in once ready, as IndexStore does for the index; until then, and
+    for the rest of a version whose shards failed to start, searches run in
+    this process.
+    """
+
+    def __init__(self, store, bot_token, search_cache=None, prefetcher=None, shards=None):
+        self.store = store
+        self.bot_token = bot_token
+        self.search_cache = search_cache or SearchResultCache()
+        if prefetcher is None:
+            client = TelegramClient(scheduler=RequestScheduler())
+            prefetcher = Prefetcher(PdfCache(), client=client, path_cache=FilePathCache())
+        self.prefetcher = prefetcher
+        self.shards = shards
+        self._sharded = None
+        self._building = None  # Index version whose ShardedSearch is being built
+        self._failed = None  # Index version whose ShardedSearch failed to start
+        self._shard_lock = threading.Lock()
+        self._search_lock = threading.Lock()
+        self._version = None
+        self._responses = OrderedDict()  # (query, limit) -> encoded /search body
+        self._positions = {}  # File ID -> row position in the current index
+
+    def _index(self):
+        """Return the live SearchIndex, resetting per-version state when it changes."""
+        index = self.store.current()
+        if index.version != self._version:
+            self._version = index.version
+            self._responses.clear()
+            self._positions = {file_id: position for position, file_id in enumerate(index.records['File ID'].astype(str))}
+        return index
+
+    def _build_shards(self, index):
+        try:
+            sharded = ShardedSearch(index, self.shards)
+        except Exception:
+            logger.exception("Could not start the search shards; searching in-process until the index changes")
+            sharded = None
+            with self._shard_lock:
+                self._failed = index.version
+        if sharded is not None:
+            with self._search_lock:
+                previous, self._sharded = self._sharded, sharded
+            if previous is not None:
+                previous.close()
+        with self._shard_lock:
+            if self._building == index.version:
+                self._building = None
+
+    def _sharded_search(self, query, limit, index):
+        """Search on the shards of ``index``, or return None while they are being built."""
+        with self._shard_lock:
+            current = self._sharded is not None and self._sharded.version == index.version
+            if not current and self._building != index.version and self._failed != index.version:
+                self._building = index.version
+                threading.Thread(target=self._build_shards, args=(index,), name='shard-build', daemon=True).start()
+        # Each shard is one process, so concurrent searches would queue there anyway
+        with self._search_lock:
+            if self._sharded is None or self._sharded.version != index.version:
+                return None
+            return self._sharded.search(query, limit=limit, typo_tolerance=True)
+
+    def _search_body(self, query, limit, index):
+        results = self._sharded_search(query, limit, index) if self.shards else None
+        if results is None:
+            results = self.search_cache.search(query, index, limit=limit, typo_tolerance=True)
+        papers = [{
+            "id": str(row['File ID']),
+            "name": row['File Name'],
+            "display_name": row.get('Display Name', row['File Name']),
+            "download_name": row.get('Download Name', row['File Name']),
+            "score": round(float(row['Match Score']), 1),
+            "fallback_ids": list(fallback_ids(row)),
+            "url": f"/file/{urllib.parse.quote(str(row['File ID']), safe='')}",
+        } for row in results.to_dict('records')]
+        return json.dumps({
+            "query": query,
+            "version": index.version,
+            "count": len(papers),
+            "results": papers,
+        }, ensure_ascii=False).encode('utf-8')
+
+    async def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return error_response(400, "Missing search query (?q=).")
+        try:
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return error_response(400, "limit must be a whole number.")
+
+        index = self._index()
+        key = (query, limit)
+        digest = hashlib.sha1(f"{limit}\0{query}".encode('utf-8')).hexdigest()[:16]
+        headers = {
+            'ETag': f'"{index.version}-{digest}"',
+            'Cache-Control': f'public, max-age={SEARCH_MAX_AGE}',
+        }
+        if etag_matches(request, headers['ETag']):
+            return Response(status_code=304, headers=headers)
+
+        body = self._responses.get(key)
+        if body is None:
+            body = await run_in_threadpool(self._search_body, query, limit, index)
+            if index.version == self._version:
+                self._responses[key] = body
+                while len(self._responses) > RESPONSE_CACHE_SIZE:
+                    self._responses.popitem(last=False)
+        else:
+            self._responses.move_to_end(key)
+        return Response(body, media_type='application/json', headers=headers)
+
+    async def file(self, request):
+        file_id = request.path_params['file_id']
+        index = self._index()
+        position = self._positions.get(file_id)
+        if position is None:
+            return error_response(404, "Unknown file ID.")
+        row = index.records.iloc[position]
+
+        download_name = row.get('Download Name', 'paper.pdf')
+        headers = {
+            'ETag': f'"{hashlib.sha1(file_id.encode("utf-8")).hexdigest()[:16]}"',
+            'Cache-Control': f'public, max-age={FILE_MAX_AGE}, immutable',
+            'Content-Disposition': f"attachment; filename*=UTF-8''{urllib.parse.quote(download_name)}",
+        }
+        if etag_matches(request, headers['ETag']):
+            return Response(status_code=304, headers=headers)
+        if not self.bot_token:
+            return error_response(503, "Telegram Bot Token not configured.")
+
+        pdf_file, error = await run_in_threadpool(self._open_pdf, file_id, fallback_ids(row))
+        if pdf_file is None:
+            return error_response(502, error or "Download failed.")
+        # Streamed from the open cache file in chunks rather than read into memory
+        headers['Content-Length'] = str(os.fstat(pdf_file.fileno()).st_size)
+        return StreamingResponse(read_chunks(pdf_file), media_type='application/pdf', headers=headers)
+
+    def _open_pdf(self, file_id, fallbacks):
+        """Fetch ``file_id`` into the PDF cache and open it; returns (file, error).
+
+        The open handle keeps the file readable if the cache evicts it while
+        it is being sent. If it is evicted between the fetch and the open, it
+        is fetched once more.
+        """
+        for _ in range(2):
+            error = self.prefetcher.fetch(file_id, self.bot_token, None, fallbacks)
+            if error:
+                return None, error
+            path = self.prefetcher.cache.path(file_id)
+            if path is not None:
+                try:
+                    return open(path, 'rb'), None
+                except FileNotFoundError:
+                    pass
+        return None, "Download failed."
+
+
+def read_chunks(pdf_file):
+    """Yield an open file in DOWNLOAD_CHUNK_SIZE chunks, closing it at the end."""
+    with pdf_file:
+        while chunk := pdf_file.read(DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+def create_app(service):
+    """Return the ASGI application serving ``service``."""
+    return Starlette(routes=[
+        Route('/search', service.search),
+        Route('/file/{file_id:str}', service.file),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Past Paper Vault search as a JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--csv', default=MASTER_INDEX_CSV, help="Master index CSV")
+    parser.add_argument('--snapshot', help="Binary snapshot of the master index (default: next to the CSV)")
+    parser.add_argument('--shards', type=int, default=0,
+                        help="Split searches across this many worker processes (for very large indexes)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    store = IndexStore(SearchIndex(load_master_index(args.csv, args.snapshot)), args.csv, args.snapshot)
+    service = SearchService(store, os.environ.get('TELEGRAM_BOT_TOKEN'), shards=args.shards)
+    # Per-request access logs cost more than a cached search
+    uvicorn.run(create_app(service), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
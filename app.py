@@ -1,35 +1,16 @@
 import streamlit as st
 import pandas as pd
-from rapidfuzz import process, fuzz, utils
 import urllib.parse
-import requests
-import re
 import html
+import os
 
-
-def sanitize_filename(raw_name: str) -> str:
-    """Unescape HTML entities repeatedly and strip HTML/div fragments in many encoded forms."""
-    if raw_name is None:
-        return ''
-    s = str(raw_name)
-    # Unescape HTML entities multiple times to handle double-encoding
-    for _ in range(4):
-        s = html.unescape(s)
-
-    # Remove common numeric entity forms like &#60; and variations
-    s = re.sub(r'&#\s*0*6?0?;?', '', s)
-
-    # Remove encoded or literal div tags in many variants
-    s = re.sub(r'(?i)(?:&lt;|&amp;lt;|<|\\u003c)\s*/?\s*div[^>;&]*?(?:&gt;|&amp;gt;|>|;)?', '', s)
-
-    # Remove any remaining entity-encoded tags
-    s = re.sub(r'(?i)&lt;[^&]+&gt;', '', s)
-
-    # Remove any normal HTML tags
-    s = re.sub(r'<[^>]+>', '', s)
-
-    # Trim whitespace
-    return s.strip()
+from pdfvault.text import sanitize_filename, normalize_text
+from pdfvault.index import load_master_index, fallback_ids, SearchIndex, IndexStore
+from pdfvault.search import SearchResultCache
+from pdfvault.facets import filter_key
+from pdfvault.cache import PdfCache, FilePathCache, hit_rate
+from pdfvault.telegram import TelegramClient, RequestScheduler
+from pdfvault.downloads import Prefetcher, build_zip_bundle, PREFETCH_COUNT, PREFETCH_POLL_SECONDS
 
 
 # Page configuration
@@ -190,10 +171,6 @@ st.markdown("""
             height: 40px;
             margin-bottom: 8px;
         }
-        .pdf-icon svg {
-            width: 40px;
-            height: 40px;
-        }
         /* Smaller filename text on mobile */
         .pdf-name {
             font-size: 12px;
@@ -290,34 +267,26 @@ st.markdown("""
     </script>
     """, unsafe_allow_html=True)
 
+# PDF icon, sent once as a CSS background instead of inline in every tile
+st.markdown(f"""
+    <style>
+    .pdf-icon {{
+        background: url("data:image/svg+xml,{urllib.parse.quote(' '.join(get_pdf_icon_svg().split()))}") center / contain no-repeat;
+    }}
+    </style>
+    """, unsafe_allow_html=True)
+
 
-@st.cache_data(ttl=3600)
-def load_master_index():
-    """Load the master index CSV file with caching for performance."""
+@st.cache_resource
+def get_master_index():
+    """Load the master index (see load_master_index) once per process.
+
+    Cached as a shared resource so the feature table is built once per
+    process instead of being copied into every rerun; later changes to the
+    CSV are picked up by IndexStore. Callers must not modify it.
+    """
     try:
-        csv_path = 'master_index.csv'
-        df = pd.read_csv(csv_path)
-        df.columns = df.columns.str.strip()
-        
-        # Normalize column names
-        column_mapping = {}
-        for col in df.columns:
-            col_lower = col.lower().strip()
-            if 'file' in col_lower and 'name' in col_lower:
-                column_mapping[col] = 'File Name'
-            elif 'file' in col_lower and 'id' in col_lower:
-                column_mapping[col] = 'File ID'
-        
-        if column_mapping:
-            df = df.rename(columns=column_mapping)
-        
-        # Ensure required columns exist
-        if 'File Name' not in df.columns and len(df.columns) >= 1:
-            df = df.rename(columns={df.columns[0]: 'File Name'})
-        if 'File ID' not in df.columns and len(df.columns) >= 2:
-            df = df.rename(columns={df.columns[1]: 'File ID'})
-        
-        return df
+        return load_master_index()
     except FileNotFoundError:
         st.error("❌ master_index.csv file not found!")
         return pd.DataFrame()
@@ -326,247 +295,117 @@ def load_master_index():
         return pd.DataFrame()
 
 
-def normalize_text(text):
-    """Normalize text for better matching."""
-    if not text:
-        return ""
-    text = str(text).lower()
-    # Normalize exam levels
-    text = re.sub(r'\ba/l\b', 'al', text, flags=re.IGNORECASE)
-    text = re.sub(r'\ba\s*l\b', 'al', text, flags=re.IGNORECASE)
-    text = re.sub(r'\badvanced?\s+level\b', 'al', text, flags=re.IGNORECASE)
-    text = re.sub(r'\bo/l\b', 'ol', text, flags=re.IGNORECASE)
-    text = re.sub(r'\bo\s*l\b', 'ol', text, flags=re.IGNORECASE)
-    text = re.sub(r'\bordinary\s+level\b', 'ol', text, flags=re.IGNORECASE)
-    # Replace separators with spaces
-    text = re.sub(r'[_\-\.,;:()\[\]{}]', ' ', text)
-    # Normalize multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-
-def fuzzy_search(query, df, limit=50):
-    """Perform intelligent hierarchical search with strict subject filtering.
-    
-    Query Pattern: {year} {exam type} {Subject} {pastpaper/marking} {medium}
-    
-    Search Strategy:
-    1. FILTER by subject (MANDATORY - if no match, return empty for "content uploading" message)
-    2. SORT by year (exact match first, then by proximity)
-    3. SORT by document type (marking/paper based on query)
-    4. SORT by medium (exact match first)
-    """
-    if df.empty or query.strip() == "":
-        return pd.DataFrame()
-    
-    # Find the file name column
-    file_name_col = None
-    for col in df.columns:
-        if 'file' in col.lower() and 'name' in col.lower():
-            file_name_col = col
-            break
-    
-    if file_name_col is None:
-        file_name_col = df.columns[0]
-    
-    query_lower = normalize_text(query)
-    query_words = set(query_lower.split())
-    
-    # Extract year patterns from query
-    query_years = set(re.findall(r'\b(19\d{2}|20\d{2})\b', query))
-    
-    # Define categories with priority weights
-    # Include common abbreviations and full names
-    subjects = [
-        'physics', 'chemistry', 'chem', 'biology', 'bio', 'mathematics', 'maths', 'math',
-        'combined', 'commerce', 'history', 'geography', 'geo', 'economics', 'econ',
-        'accounting', 'accounts', 'science', 'ict', 'technology', 'buddhism', 'hinduism',
-        'islam', 'christianity', 'art', 'music', 'drama', 'dancing', 'agriculture', 'agri',
-        'business', 'botany', 'zoology', 'logic', 'statistics', 'stats', 'political',
-        'sft', 'git', 'egt', 'bst', 'est',  # Common subject codes
-        'general', 'knowledge', 'gk'  # General knowledge
-    ]
-    mediums = ['sinhala', 'tamil', 'english']
-    levels = ['al', 'ol', 'grade', 'a/l', 'o/l']
-    doc_types = ['marking', 'scheme', 'paper', 'pastpaper', 'past', 'mcq', 'essay']
-    
-    # Extract query components
-    query_subjects = set([word for word in query_words if word in subjects])
-    query_mediums = set([word for word in query_words if word in mediums])
-    query_levels = set([word for word in query_words if word in levels])
-    query_doc_types = set([word for word in query_words if word in doc_types])
-    
-    # STEP 1: STRICT SUBJECT FILTERING
-    # If query has a subject, ONLY keep files that CONTAIN that exact subject
-    # FALLBACK: If no subject matches found, show files matching exam level (A/L, O/L)
-    filtered_results = []
-    fallback_results = []
-    
-    for idx, row in df.iterrows():
-        filename = str(row[file_name_col])
-        filename_lower = normalize_text(filename)
-        filename_words = set(filename_lower.split())
-        
-        # Extract components from filename
-        file_years = set(re.findall(r'\b(19\d{2}|20\d{2})\b', filename_lower))
-        file_subjects = set([word for word in filename_words if word in subjects])
-        file_mediums = set([word for word in filename_words if word in mediums])
-        file_doc_types = set([word for word in filename_words if word in doc_types])
-        file_levels = set([word for word in filename_words if word in levels])
-        
-        # MANDATORY SUBJECT CHECK - STRICT MODE
-        if query_subjects:
-            # Check if file contains the queried subject
-            has_matching_subject = bool(query_subjects & file_subjects)
-            
-            if has_matching_subject:
-                pass  # Will add to filtered_results below
-            else:
-                # NOT matching subject - add to fallback only if level matches
-                if query_levels and file_levels and (query_levels & file_levels):
-                    fallback_results.append({
-                        'index': idx,
-                        'filename': filename,
-                        'year_match': 9999,
-                        'doc_type_match': 1,
-                        'medium_match': 1,
-                        'word_match': 0
-                    })
-                continue  # Skip to next file - DO NOT add to filtered_results
-        
-        # Calculate sorting keys for hierarchical sort
-        
-        # Sort Key 1: Year Match (0 = perfect, higher = worse)
-        year_match_score = 9999  # Default: no year
-        if query_years and file_years:
-            query_year = int(list(query_years)[0])
-            closest_file_year = min(file_years, key=lambda y: abs(int(y) - query_year))
-            year_match_score = abs(int(closest_file_year) - query_year)
-        elif query_years and not file_years:
-            year_match_score = 9998  # Has query year but file doesn't - lower priority
-        elif not query_years and file_years:
-            year_match_score = 100  # No query year but file has year - decent priority
-        
-        # Sort Key 2: Document Type Match (0 = perfect match, 1 = no match)
-        doc_type_match = 1 if query_doc_types else 0
-        if query_doc_types and file_doc_types:
-            doc_type_match = 0 if (query_doc_types & file_doc_types) else 1
-        
-        # Sort Key 3: Medium Match (0 = perfect match, 1 = no match)
-        medium_match = 1 if query_mediums else 0
-        if query_mediums and file_mediums:
-            medium_match = 0 if (query_mediums & file_mediums) else 1
-        
-        # Sort Key 4: Overall relevance (word matches)
-        common_words = query_words & filename_words
-        word_match_count = -len(common_words)  # Negative for descending sort
-        
-        result_entry = {
-            'index': idx,
-            'filename': filename,
-            'year_match': year_match_score,
-            'doc_type_match': doc_type_match,
-            'medium_match': medium_match,
-            'word_match': word_match_count
-        }
-        
-        # Add to filtered_results (only reaches here if subject matched or no subject in query)
-        filtered_results.append(result_entry)
-    
-    # Use fallback only if no subject matches found
-    if not filtered_results and fallback_results:
-        filtered_results = fallback_results
-    
-    # STEP 2: HIERARCHICAL SORT
-    # Sort by: Year (ascending) → Doc Type (ascending) → Medium (ascending) → Word matches (descending)
-    filtered_results.sort(key=lambda x: (x['year_match'], x['doc_type_match'], x['medium_match'], x['word_match']))
-    
-    # Limit results
-    top_results = filtered_results[:limit]
-    
-    if not top_results:
-        return pd.DataFrame()
-    
-    # Get corresponding rows
-    top_indices = [r['index'] for r in top_results]
-    results = df.loc[top_indices].copy()
-    
-    # Calculate match percentage for display
-    match_scores = []
-    for r in top_results:
-        # Perfect match = 100%, decreases with year diff, doc type, medium mismatch
-        score = 100.0
-        
-        # Year penalty: -5% per year difference
-        if r['year_match'] < 9990:
-            score -= min(r['year_match'] * 5, 50)
-        
-        # Doc type penalty: -10% if mismatch
-        if r['doc_type_match'] == 1:
-            score -= 10
-        
-        # Medium penalty: -15% if mismatch
-        if r['medium_match'] == 1:
-            score -= 15
-        
-        match_scores.append(max(score, 10.0))  # Minimum 10%
-    
-    results['Match Score'] = match_scores
-    
-    # Preserve the sort order (already sorted hierarchically)
-    results = results.reset_index(drop=True)
-    
-    return results
+@st.cache_resource
+def get_index_store():
+    """Return the index store shared by all sessions."""
+    return IndexStore(SearchIndex(get_master_index()))
 
 
-def get_telegram_file_content(file_id, bot_token):
-    """Download file content from Telegram and return bytes."""
-    try:
-        # Validate inputs
-        if not bot_token:
-            return None, "❌ Telegram Bot Token not configured."
-        
-        file_id_str = str(file_id).strip()
-        if not file_id_str:
-            return None, "❌ Invalid file ID: File ID is empty."
-        
-        # Get file path from Telegram
-        api_url = f"https://api.telegram.org/bot{bot_token}/getFile"
-        params = {"file_id": file_id_str}
-        
-        response = requests.get(api_url, params=params, timeout=10)
-        result = response.json()
-        
-        if not result.get("ok"):
-            error_description = result.get("description", "Unknown error")
-            error_code = result.get("error_code", "N/A")
-            return None, f"❌ Telegram API error ({error_code}): {error_description}"
-        
-        file_path = result["result"]["file_path"]
-        
-        # Download the file content
-        download_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
-        file_response = requests.get(download_url, timeout=30)
-        file_response.raise_for_status()
-        
-        return file_response.content, None
-    
-    except requests.exceptions.Timeout:
-        return None, "❌ Request timed out. Please try again."
-    except requests.exceptions.RequestException as e:
-        return None, f"❌ Network error: {str(e)}"
-    except KeyError as e:
-        return None, f"❌ Unexpected API response format: {str(e)}"
-    except Exception as e:
-        return None, f"❌ Error downloading file: {str(e)}"
+def load_search_index():
+    """Return the shared SearchIndex, reloading it when master_index.csv changes."""
+    return get_index_store().current()
+
+
+@st.cache_resource
+def get_search_cache():
+    """Return the search result cache shared by all sessions."""
+    return SearchResultCache()
+
+
+@st.cache_resource
+def get_pdf_cache():
+    """Return the PDF cache shared by all sessions."""
+    return PdfCache()
+
+
+@st.cache_resource
+def get_request_scheduler():
+    """Return the Bot API scheduler shared by all sessions."""
+    return RequestScheduler()
+
+
+@st.cache_resource
+def get_telegram_client():
+    """Return the Telegram client shared by all sessions."""
+    return TelegramClient(scheduler=get_request_scheduler())
+
+
+@st.cache_resource
+def get_file_path_cache():
+    """Return the getFile result cache shared by all sessions."""
+    return FilePathCache()
+
+
+@st.cache_resource
+def get_prefetcher():
+    """Return the prefetcher shared by all sessions."""
+    return Prefetcher(get_pdf_cache(), client=get_telegram_client(), path_cache=get_file_path_cache())
+
+
+def wait_for_prefetch(file_id):
+    """Poll a background download and rerun the app once it has finished."""
+    if not get_prefetcher().pending(file_id):
+        st.rerun()
+    st.caption("⏳ Fetching in the background...")
+
+
+def discard_bundle():
+    """Delete the session's ZIP bundle, if it has one."""
+    bundle = st.session_state.get('bundle')
+    st.session_state.bundle = None
+    if bundle:
+        try:
+            os.remove(bundle['path'])
+        except FileNotFoundError:
+            pass
+
+
+def render_cache_metrics():
+    """Show the shared caches' hit rates in the (collapsed) sidebar."""
+    with st.sidebar:
+        st.markdown("### 📊 Cache Metrics")
+        st.metric("Search Results", hit_rate(get_search_cache()))
+        st.metric("PDF Files", hit_rate(get_pdf_cache()))
+        st.metric("Download Links", hit_rate(get_file_path_cache()))
+
+
+# Result tiles per page (three rows of the three-column grid)
+PAGE_SIZE = 9
+
+
+def change_page(step):
+    """Move the results grid ``step`` pages forward or back."""
+    st.session_state.page += step
+
+
+def reset_results():
+    """Start the results over after the search or its filters change."""
+    st.session_state.download_cache = {}  # Forget prepared downloads on new search
+    st.session_state.prefetched = set()
+    st.session_state.page = 0
+    discard_bundle()
+
+
+def apply_suggestion(query):
+    """Search for a completion picked under the search box."""
+    st.session_state.search_input = query
 
 
 def main():
     # Initialize session state
     if 'search_query' not in st.session_state:
         st.session_state.search_query = ""
+    if 'search_input' not in st.session_state:
+        st.session_state.search_input = ""  # Search box text; suggestions replace it
     if 'download_cache' not in st.session_state:
+        # File ID -> error message (or None) for downloads this session prepared
         st.session_state.download_cache = {}
+    if 'prefetched' not in st.session_state:
+        st.session_state.prefetched = set()  # File IDs prefetched for the current search
+    if 'page' not in st.session_state:
+        st.session_state.page = 0  # Results page shown in the grid
+    if 'bundle' not in st.session_state:
+        st.session_state.bundle = None  # ZIP of the current results, once built
     if 'data_loaded' not in st.session_state:
         st.session_state.data_loaded = False
     
@@ -679,7 +518,8 @@ def main():
         st.stop()
     
     # Load data
-    df = load_master_index()
+    index = load_search_index()
+    df = index.df
     
     # Clear loading screen once data is loaded
     if not st.session_state.data_loaded:
@@ -690,6 +530,8 @@ def main():
         st.warning("⚠️ No data available. Please ensure master_index.csv is present.")
         return
     
+    render_cache_metrics()
+    
     # Get query parameter from URL
     query_params = st.query_params
     url_query = query_params.get("q", "")
@@ -697,13 +539,13 @@ def main():
         url_query = urllib.parse.unquote_plus(url_query)
         if url_query != st.session_state.search_query:
             st.session_state.search_query = url_query
+            st.session_state.search_input = url_query
     
     # Search interface
     col1, col2, col3, col4 = st.columns([1, 4, 0.8, 1])
     with col2:
         search_query = st.text_input(
             "Search",
-            value=st.session_state.search_query,
             placeholder="Search for past papers... (e.g., physics 2021, mathematics, chemistry)",
             key="search_input",
             label_visibility="collapsed"
@@ -720,12 +562,31 @@ def main():
     # Handle search
     if search_button or search_query != st.session_state.search_query:
         st.session_state.search_query = search_query
-        st.session_state.download_cache = {}  # Clear download cache on new search
+        reset_results()
+    
+    # Completions for the last word, as one-click searches
+    suggestions = [(query, count) for query, count in index.suggest(search_query) if query != normalize_text(search_query)]
+    if suggestions:
+        suggestion_cols = st.columns([1] + [4 / len(suggestions)] * len(suggestions) + [1.8])
+        for col, (query, count) in zip(suggestion_cols[1:], suggestions):
+            with col:
+                st.button(f"{query} · {count}", key=f"suggest_{query}", on_click=apply_suggestion,
+                          args=(query,), use_container_width=True)
     
     # Display results
     if st.session_state.search_query:
+        # Filter chips, each with the number of papers it would leave
+        filters = {facet: st.session_state.get(f"facet_{facet}") or [] for facet in index.facets.slots}
+        with st.expander("🎛️ Filters", expanded=bool(filter_key(filters))):
+            for facet, counts in index.facets.counts(filters).items():
+                if counts:
+                    st.pills(facet, list(counts), selection_mode="multi", key=f"facet_{facet}",
+                             format_func=lambda label, counts=counts: f"{label} · {counts[label]}",
+                             on_change=reset_results)
+        
         with st.spinner('🔍 Searching for your past papers... Please wait'):
-            results = fuzzy_search(st.session_state.search_query, df, limit=30)
+            results = get_search_cache().search(st.session_state.search_query, index, limit=30, typo_tolerance=True,
+                                                filters=filters)
 
         if not results.empty:
             file_name_col = [col for col in results.columns if 'file' in col.lower() and 'name' in col.lower()]
@@ -734,26 +595,66 @@ def main():
             file_name_col = file_name_col[0] if file_name_col else results.columns[0]
             file_id_col = file_id_col[0] if file_id_col else results.columns[1]
 
+            pdf_cache = get_pdf_cache()
+            prefetcher = get_prefetcher()
+            
+            # Start downloading the top results in the background
+            if not st.session_state.prefetched:
+                fallbacks = {str(row[file_id_col]): fallback_ids(row) for _, row in results.head(PREFETCH_COUNT).iterrows()}
+                top_ids = list(fallbacks)
+                prefetcher.prefetch(top_ids, bot_token, fallbacks)
+                st.session_state.prefetched = set(top_ids)
+            
+            # Download all results as one ZIP
+            bundle = st.session_state.bundle
+            if bundle is not None and not os.path.exists(bundle['path']):
+                bundle = st.session_state.bundle = None  # Cleaned out of the temp directory
+            if bundle is None:
+                if st.button(f"📦 Download All ({len(results)} PDFs)", key="bundle_btn", use_container_width=True):
+                    files = [(str(row[file_id_col]), row['Download Name'], fallback_ids(row)) for _, row in results.iterrows()]
+                    progress_bar = st.progress(0.0, text="⏳ Bundling your PDFs... Please wait")
+                    zip_path, failures = build_zip_bundle(
+                        files, bot_token, prefetcher,
+                        progress=lambda done, total: progress_bar.progress(done / total, text=f"⏳ Bundling your PDFs... {done}/{total}")
+                    )
+                    st.session_state.bundle = {'path': zip_path, 'failures': failures}
+                    st.rerun()
+            else:
+                if bundle['failures']:
+                    st.warning(f"⚠️ {len(bundle['failures'])} of {len(results)} PDFs could not be downloaded; see FAILED.txt in the ZIP.")
+                zip_name = f"{sanitize_filename(st.session_state.search_query) or 'past_papers'}.zip"
+                with open(bundle['path'], 'rb') as zip_file:
+                    st.download_button(
+                        label="⬇️ Download ZIP",
+                        data=zip_file,
+                        file_name=zip_name,
+                        mime="application/zip",
+                        use_container_width=True,
+                        key="bundle_download"
+                    )
+            
+            # Only the current page of the cached ranked list is rendered
+            page_count = -(-len(results) // PAGE_SIZE)
+            st.session_state.page = min(max(st.session_state.page, 0), page_count - 1)
+            start = st.session_state.page * PAGE_SIZE
+            
             num_cols = 3
             cols = st.columns(num_cols)
 
-            for idx, (row_idx, row) in enumerate(results.iterrows()):
-                file_name = row[file_name_col]
+            for idx, (row_idx, row) in enumerate(results.iloc[start:start + PAGE_SIZE].iterrows(), start=start):
                 file_id = str(row[file_id_col])
                 match_score = row.get('Match Score', 0)
 
-                # Clean filename
-                raw_name = str(file_name)
-                cleaned = sanitize_filename(raw_name)
-                display_name = html.escape(cleaned.replace('_', ' ').replace('-', ' '))
+                # Names are sanitized once at index load
+                display_name = html.escape(row['Display Name'])
                 
-                col_idx = idx % num_cols
+                col_idx = (idx - start) % num_cols
 
                 with cols[col_idx]:
                     # Render tile
                     tile_html = f"""
                     <div class="pdf-tile">
-                        <div class="pdf-icon">{get_pdf_icon_svg()}</div>
+                        <div class="pdf-icon"></div>
                         <div class="pdf-name">{display_name}</div>
                         <div style='text-align:center; margin-top:4px;'>
                             <span class="match-badge" style='background-color: rgba(219, 70, 59, 0.2); color: #db463b; padding: 2px 8px; border-radius: 4px; font-size: 11px; font-weight: 600;'>Match: {match_score:.1f}%</span>
@@ -762,31 +663,59 @@ def main():
                     """
                     st.markdown(tile_html, unsafe_allow_html=True)
                     
-                    # Download button with caching
-                    cache_key = f"file_content_{file_id}"
+                    # Download button backed by the shared PDF cache; the
+                    # session only remembers which files it has prepared
+                    file_content = None
+                    if (file_id in st.session_state.prefetched
+                            and file_id not in st.session_state.download_cache
+                            and file_id in pdf_cache):
+                        st.session_state.download_cache[file_id] = None  # Prefetched and ready
+                    error = st.session_state.download_cache.get(file_id)
+                    if file_id in st.session_state.download_cache and not error:
+                        file_content = pdf_cache.read(file_id)
                     
-                    if cache_key in st.session_state.download_cache:
-                        # File already downloaded, show download button
-                        file_content, error = st.session_state.download_cache[cache_key]
-                        if error:
-                            st.error(error)
-                        else:
-                            filename = cleaned if cleaned.lower().endswith('.pdf') else f"{cleaned}.pdf"
-                            st.download_button(
-                                label="⬇️ Download PDF",
-                                data=file_content,
-                                file_name=filename,
-                                mime="application/pdf",
-                                use_container_width=True,
-                                key=f"download_{file_id}_{idx}"
-                            )
+                    if error:
+                        st.error(error)
+                    elif file_content is not None:
+                        st.download_button(
+                            label="⬇️ Download PDF",
+                            data=file_content,
+                            file_name=row['Download Name'],
+                            mime="application/pdf",
+                            use_container_width=True,
+                            key=f"download_{file_id}_{idx}"
+                        )
                     else:
+                        if prefetcher.pending(file_id):
+                            # Show the download button as soon as the prefetch lands
+                            st.fragment(wait_for_prefetch, run_every=PREFETCH_POLL_SECONDS)(file_id)
+                        
                         # Prepare download button
                         if st.button("📥 Prepare Download", key=f"prepare_{file_id}_{idx}", use_container_width=True):
                             with st.spinner("⏳ Preparing your download... Please wait"):
-                                file_content, error = get_telegram_file_content(file_id, bot_token)
-                                st.session_state.download_cache[cache_key] = (file_content, error)
+                                queue_status = st.empty()
+                                error = prefetcher.fetch(file_id, bot_token, on_wait=lambda position, eta: queue_status.caption(
+                                    f"🚦 Telegram is busy: {position} ahead of you in the queue, about {eta:.0f}s"
+                                ), fallback_ids=fallback_ids(row))
+                                st.session_state.download_cache[file_id] = error
                                 st.rerun()
+            
+            # Page navigation
+            if page_count > 1:
+                prev_col, info_col, next_col = st.columns([1, 2, 1])
+                with prev_col:
+                    st.button("← Previous", key="prev_page", on_click=change_page, args=(-1,),
+                              disabled=st.session_state.page == 0, use_container_width=True)
+                with info_col:
+                    st.markdown(
+                        f"<div style='text-align:center; color:#ffffff; padding-top:0.5rem;'>"
+                        f"Page {st.session_state.page + 1} of {page_count} · "
+                        f"{start + 1}–{min(start + PAGE_SIZE, len(results))} of {len(results)} papers</div>",
+                        unsafe_allow_html=True
+                    )
+                with next_col:
+                    st.button("Next →", key="next_page", on_click=change_page, args=(1,),
+                              disabled=st.session_state.page >= page_count - 1, use_container_width=True)
         else:
             st.markdown("""
             <div class="no-results" style="text-align: center; padding: 2rem 1rem; color: #ffffff;">
@@ -0,0 +1,394 @@
+"""
+Benchmarks for the Past Paper Vault search helpers
+Run this with: python benchmark.py
+
+Builds synthetic master indexes of 1k, 10k and 100k papers (add 1000000 with
+--sizes for the 1M run) named like the real channel uploads, then measures
+load_master_index, normalize_text, sanitize_filename and fuzzy_search over a
+fixed query mix. Latency percentiles and peak traced memory are written to
+benchmark_results.json, and the run fails when a limit in
+benchmark_thresholds.json is exceeded.
+
+    python benchmark.py --sizes 1000,10000 --output results.json
+    python benchmark.py --legacy   # normalize_text against the old normalizer
+    python benchmark.py --workers 1,2,4 --sizes 1000000   # sharded search scaling
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Set UTF-8 encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+import numpy as np
+import pandas as pd
+from pdfvault.text import normalize_text, normalize_many, sanitize_filename
+from pdfvault.index import load_master_index, SearchIndex
+from pdfvault.search import fuzzy_search
+from pdfvault.shards import ShardedSearch
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+RESULTS_FILE = 'benchmark_results.json'
+THRESHOLDS_FILE = 'benchmark_thresholds.json'
+
+# Queries as typed in the search box: exact subjects, years, mediums and doc
+# types, a query with no subject (level fallback) and misspellings
+QUERY_MIX = [
+    "physics 2019",
+    "combined maths 2021 sinhala",
+    "chemistry marking scheme",
+    "biology 2018 english medium past paper",
+    "economics",
+    "ict 2023 tamil",
+    "al 2020",
+    "agriculture model paper 2015",
+    "accounting mcq",
+    "history 2010 essay",
+    "physcis 2019",
+    "chemestry 2022 sinhala",
+]
+
+SUBJECTS = [
+    'physics', 'chemistry', 'biology', 'combined-mathematics', 'economics', 'ict',
+    'business-statistics', 'geography', 'history', 'agriculture', 'buddhism', 'art',
+    'western-music', 'accounting', 'political-science', 'logic', 'mechanical-technology',
+    'bio-resource-technology', 'islam-civilization', 'engineering-technology',
+]
+SCHOOLS = ['royal-college-colombo-07', 'ananda-college', 'visakha-vidyalaya', 'dharmaraja-college']
+PROVINCES = ['southern', 'western', 'north-western', 'central', 'sabaragamuwa']
+
+
+def synthetic_catalogue(rows, seed=0):
+    """Return a master index of ``rows`` synthetic papers named like the channel's uploads.
+
+    Most names follow the ``gce-advance-level-exam-YYYY-subject-...`` pattern,
+    with term tests and hand-named uploads mixed in; about one file in five is
+    uploaded twice with a " (1)" copy suffix, as in the real index.
+    """
+    rng = random.Random(seed)
+    names = []
+    while len(names) < rows:
+        year = rng.randint(1985, 2025)
+        subject = rng.choice(SUBJECTS)
+        kind = rng.random()
+        if kind < 0.6:
+            papers = rng.choice(['past-papers', 'model-papers', 'marking-scheme'])
+            name = f"gce-advance-level-exam-{year}-{subject}-{papers}-{rng.getrandbits(52):013x}"
+        elif kind < 0.8:
+            school = rng.choice([f"{rng.choice(PROVINCES)}-province", rng.choice(SCHOOLS)])
+            term = rng.choice(['1', '2', '3rd'])
+            name = f"{school}-grade-{rng.choice([10, 11, 12, 13])}-{subject}-{year}-{term}-term-test-paper-{rng.getrandbits(52):013x}"
+        else:
+            medium = rng.choice(['Sinhala', 'Tamil', 'English'])
+            doc_type = rng.choice(['Past Paper', 'Marking Scheme', 'MCQ', 'Essay Paper'])
+            name = f"{rng.choice(['AL', 'A/L', 'OL', 'O/L'])} {subject.replace('-', ' ').title()} {medium} Medium {doc_type} {year}"
+        names.append(f"{name}.pdf")
+        if rng.random() < 0.2:
+            names.append(f"{name} (1).pdf")
+    names = names[:rows]
+    return pd.DataFrame({
+        'File Name': names,
+        'File ID': [f"BQACAgUAAyEGAASpjFBF{position:012d}" for position in range(rows)],
+    })
+
+
+def percentiles(timings):
+    """Summarize timings in seconds as millisecond percentiles."""
+    timings = np.asarray(timings) * 1000
+    return {
+        'runs': len(timings),
+        'p50_ms': round(float(np.percentile(timings, 50)), 4),
+        'p95_ms': round(float(np.percentile(timings, 95)), 4),
+        'p99_ms': round(float(np.percentile(timings, 99)), 4),
+        'max_ms': round(float(timings.max()), 4),
+    }
+
+
+def time_calls(func, args_list):
+    """Call ``func`` once per argument tuple and return each call's duration.
+
+    The garbage collector is paused while timing, as timeit does, so a
+    collection triggered by earlier allocations is not charged to one call.
+    """
+    timings = []
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if collecting:
+            gc.enable()
+    return timings
+
+
+def call_all(func, args_list):
+    """Call ``func`` once per argument tuple, dropping each result."""
+    for args in args_list:
+        func(*args)
+
+
+def peak_memory(func):
+    """Return the peak traced allocation of one ``func()`` call in MB."""
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def measure(func, args_list, warmup=False):
+    """Latency percentiles over ``args_list`` plus the peak memory of one pass.
+
+    With ``warmup``, one untimed pass over ``args_list`` runs first, so lazy
+    imports and first-touch allocations do not land in the percentiles.
+    """
+    if warmup:
+        call_all(func, args_list)
+    stats = percentiles(time_calls(func, args_list))
+    stats['peak_mb'] = peak_memory(lambda: call_all(func, args_list))
+    return stats
+
+
+def benchmark_load(catalogue, repeat):
+    """Time load_master_index from the CSV (cold) and from its snapshot (warm)."""
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'master_index.csv')
+        snapshot_path = os.path.join(directory, 'master_index.npz')
+        catalogue.to_csv(csv_path, index=False)
+
+        def cold():
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            load_master_index(csv_path, snapshot_path)
+
+        results = {'load_master_index.cold': measure(cold, [()] * repeat)}
+        load_master_index(csv_path, snapshot_path)
+        results['load_master_index.warm'] = measure(lambda: load_master_index(csv_path, snapshot_path), [()] * repeat)
+        index = SearchIndex(load_master_index(csv_path, snapshot_path))
+        results['search_index.build'] = measure(lambda: SearchIndex(index.df), [()] * repeat)
+        return results, index
+
+
+def benchmark_per_name(func, names, chunk=1000):
+    """Per-name latency of ``func``, timed over chunks of ``chunk`` names."""
+    chunks = [(names[start:start + chunk],) for start in range(0, len(names), chunk)]
+    timings = time_calls(lambda batch: [func(name) for name in batch], chunks)
+    stats = percentiles([timing / len(batch) * 1000 for timing, (batch,) in zip(timings, chunks)])
+    # Percentiles above are in µs per name; relabel them
+    stats = {key.replace('_ms', '_us'): value for key, value in stats.items()}
+    stats['peak_mb'] = peak_memory(lambda: call_all(func, ((name,) for name in names)))
+    return stats
+
+
+# Filter chip selections, from one chip to one in each of four facets
+FILTER_MIX = [
+    {'Year': ['2021']},
+    {'Medium': ['Sinhala'], 'Level': ['A/L']},
+    {'Subject': ['Physics', 'Chemistry'], 'Doc Type': ['Marking Scheme']},
+    {'Year': ['2019', '2020'], 'Medium': ['Tamil'], 'Subject': ['Maths'], 'Level': ['O/L']},
+]
+
+
+def benchmark_size(rows, rounds=5):
+    """Run every benchmark on a synthetic master index of ``rows`` papers."""
+    catalogue = synthetic_catalogue(rows)
+    results, index = benchmark_load(catalogue, repeat=1 if rows >= 1_000_000 else 3)
+
+    names = catalogue['File Name'].tolist()
+    results['normalize_text'] = benchmark_per_name(normalize_text, names)
+    results['sanitize_filename'] = benchmark_per_name(sanitize_filename, names)
+
+    # Same call as the UI: the top 30 results with typo tolerance
+    def search(query):
+        return fuzzy_search(query, index.df, limit=30, index=index, typo_tolerance=True)
+
+    results['fuzzy_search'] = measure(search, [(query,) for query in QUERY_MIX] * rounds, warmup=True)
+
+    facets = index.facets
+
+    def facet_counts(filters):
+        facets._counts.clear()  # Time the popcounts, not the memoized tables
+        return facets.counts(filters)
+
+    selections = [(filters,) for filters in FILTER_MIX] * rounds * 5
+    results['facet_filter'] = measure(facets.count, selections, warmup=True)
+    results['facet_counts'] = measure(facet_counts, selections, warmup=True)
+    return results
+
+
+def benchmark_sharding(rows, workers, rounds=5):
+    """Search throughput of ShardedSearch for each worker count in ``workers``.
+
+    The single-process fuzzy_search is measured first as the baseline; each
+    query runs on all shards at once, so the speedup shows how well one
+    search spreads over the worker processes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'master_index.csv')
+        synthetic_catalogue(rows).to_csv(csv_path, index=False)
+        index = SearchIndex(load_master_index(csv_path, os.path.join(directory, 'master_index.npz')))
+    queries = [(query,) for query in QUERY_MIX] * rounds
+
+    def throughput(search):
+        timings = time_calls(search, queries)
+        stats = percentiles(timings)
+        stats['queries_per_s'] = round(len(timings) / sum(timings), 1)
+        return stats
+
+    results = {'fuzzy_search': throughput(
+        lambda query: fuzzy_search(query, index.df, limit=30, index=index, typo_tolerance=True))}
+    for count in workers:
+        sharded = ShardedSearch(index, count)
+        try:
+            stats = throughput(lambda query: sharded.search(query, limit=30, typo_tolerance=True))
+        finally:
+            sharded.close()
+        stats['speedup'] = round(stats['queries_per_s'] / results['fuzzy_search']['queries_per_s'], 2)
+        results[f'sharded.{count}'] = stats
+    return results
+
+
+def check_thresholds(results, thresholds):
+    """Return a message for every metric above its limit in ``thresholds``.
+
+    ``thresholds`` maps catalogue size -> benchmark -> metric -> limit, in the
+    layout of the results; sizes that were not run are skipped.
+    """
+    failures = []
+    for size, benchmarks in thresholds.items():
+        for name, limits in benchmarks.items():
+            measured = results.get(size, {}).get(name)
+            if measured is None:
+                continue
+            for metric, limit in limits.items():
+                if measured.get(metric, 0) > limit:
+                    failures.append(f"{name} @ {size} rows: {metric} {measured[metric]} > {limit}")
+    return failures
+
+
+def run_benchmarks(sizes, output=RESULTS_FILE, thresholds_path=THRESHOLDS_FILE):
+    """Run the suite, write the results and return the threshold failures."""
+    results = {}
+    for rows in sizes:
+        print(f"Benchmarking {rows} papers...")
+        results[str(rows)] = benchmark_size(rows)
+        for name, stats in results[str(rows)].items():
+            latency = ' '.join(f"{key}={value}" for key, value in stats.items() if key.startswith('p'))
+            print(f"  {name:26} {latency}")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    if not os.path.exists(thresholds_path):
+        return []
+    with open(thresholds_path, encoding='utf-8') as f:
+        return check_thresholds(results, json.load(f))
+
+
+def legacy_normalize_text(text):
+    """Previous eight-pass normalize_text, kept as the comparison baseline."""
+    if not text:
+        return ""
+    text = str(text).lower()
+    text = re.sub(r'\ba/l\b', 'al', text, flags=re.IGNORECASE)
+    text = re.sub(r'\ba\s*l\b', 'al', text, flags=re.IGNORECASE)
+    text = re.sub(r'\badvanced?\s+level\b', 'al', text, flags=re.IGNORECASE)
+    text = re.sub(r'\bo/l\b', 'ol', text, flags=re.IGNORECASE)
+    text = re.sub(r'\bo\s*l\b', 'ol', text, flags=re.IGNORECASE)
+    text = re.sub(r'\bordinary\s+level\b', 'ol', text, flags=re.IGNORECASE)
+    text = re.sub(r'[_\-\.,;:()\[\]{}]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def best_of(func, repeat=5):
+    """Return the fastest of ``repeat`` runs of ``func`` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_normalize(csv_path='master_index.csv', rounds=20):
+    """Compare normalize_text and normalize_many with the legacy normalizer."""
+    names = pd.read_csv(csv_path).iloc[:, 0].astype(object)
+    names = pd.concat([names] * rounds, ignore_index=True)
+
+    expected = [legacy_normalize_text(name) for name in names]
+    assert [normalize_text(name) for name in names] == expected, "normalize_text output changed"
+    assert normalize_many(names).tolist() == expected, "normalize_many output changed"
+
+    legacy = best_of(lambda: [legacy_normalize_text(name) for name in names])
+    single = best_of(lambda: [normalize_text(name) for name in names])
+    batch = best_of(lambda: normalize_many(names))
+
+    print(f"normalize_text on {len(names)} names from {csv_path}:")
+    print(f"  legacy (8 passes)   {legacy * 1e6 / len(names):7.2f} µs/name")
+    print(f"  normalize_text      {single * 1e6 / len(names):7.2f} µs/name  ({legacy / single:.1f}x)")
+    print(f"  normalize_many      {batch * 1e6 / len(names):7.2f} µs/name  ({legacy / batch:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search, index loading and filename handling.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated catalogue sizes (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument('--output', default=RESULTS_FILE, help="Where to write the JSON results")
+    parser.add_argument('--thresholds', default=THRESHOLDS_FILE, help="JSON file of regression limits")
+    parser.add_argument('--legacy', action='store_true',
+                        help="Only compare normalize_text with the legacy normalizer")
+    parser.add_argument('--workers', help="Only measure sharded search with these worker counts (e.g. 1,2,4)")
+    args = parser.parse_args()
+
+    if args.legacy:
+        benchmark_normalize()
+        return 0
+
+    if args.workers:
+        workers = [int(count) for count in args.workers.split(',') if count]
+        results = {}
+        for rows in (int(size) for size in args.sizes.split(',') if size):
+            print(f"Sharded search over {rows} papers (os.cpu_count() = {os.cpu_count()})...")
+            results[str(rows)] = benchmark_sharding(rows, workers)
+            for name, stats in results[str(rows)].items():
+                print(f"  {name:14} {stats['queries_per_s']:8.1f} queries/s  p95_ms={stats['p95_ms']}"
+                      f"  speedup={stats.get('speedup', 1.0)}")
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'sharding': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    failures = run_benchmarks(sizes, args.output, args.thresholds)
+    if failures:
+        print("❌ Performance regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("✅ All benchmarks within thresholds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,16 @@ On first run, you'll be prompted to:
 1. Enter your phone number
 2. Enter the verification code sent to Telegram
 3. Enter your 2FA password (if enabled)
+
+Usage:
+    python fix_index.py                  # Full crawl, rewrites OUTPUT_CSV
+    python fix_index.py --incremental    # Only messages newer than OUTPUT_CSV's checkpoint,
+                                         # upserted into OUTPUT_CSV
 """
+import argparse
+import json
 import os
+import tempfile
 import pandas as pd
 import asyncio
 from telethon import TelegramClient, utils
@@ -24,11 +32,88 @@ CHANNEL = '@examlanka'  # Channel username (with @)
 # CHANNEL = -1002844545093  # Uncomment and use if username doesn't work
 INPUT_CSV = 'master_index.csv'
 OUTPUT_CSV = 'master_index_final.csv'
+# Highest message id already in an output CSV, kept next to it as
+# <output>.checkpoint.json for --incremental runs
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+# Incremental runs save the CSV and checkpoint after this many messages
+CHECKPOINT_EVERY = 200
+# Telegram's stable id for the uploaded document. Telethon does not expose the
+# Bot API file_unique_id, and a column name containing both "file" and "id"
+# would be taken for the File ID column by the app.
+KEY_COLUMN = 'Document ID'
 
 # Use a different session name to avoid bot token session
 client = TelegramClient('user_session', API_ID, API_HASH)
 
-async def main():
+
+def checkpoint_path(output_csv):
+    """Return the checkpoint file of ``output_csv``."""
+    return output_csv + CHECKPOINT_SUFFIX
+
+
+def load_checkpoint(output_csv):
+    """Return the last message id from CHANNEL already in ``output_csv``, or 0."""
+    if not os.path.exists(output_csv):
+        return 0
+    try:
+        with open(checkpoint_path(output_csv), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return 0
+    if checkpoint.get('channel') != str(CHANNEL):
+        return 0
+    return int(checkpoint.get('last_message_id', 0))
+
+
+def atomic_write(path, write):
+    """Call write(temp_path), then move the finished file over ``path``."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.part')
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def save_checkpoint(output_csv, last_message_id):
+    """Record that ``output_csv`` holds CHANNEL's files up to ``last_message_id``."""
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'channel': str(CHANNEL), 'last_message_id': last_message_id}, f)
+    atomic_write(checkpoint_path(output_csv), write)
+
+
+def upsert_rows(df, new_data):
+    """Insert or replace rows of ``df`` with ``new_data``, keyed by KEY_COLUMN.
+
+    Rows written before KEY_COLUMN existed are matched by File ID instead.
+    Existing rows keep their order; new files are appended.
+    """
+    new_df = pd.DataFrame(new_data).drop_duplicates(KEY_COLUMN, keep='last')
+    if df.empty:
+        return new_df.reset_index(drop=True)
+    if KEY_COLUMN not in df.columns:
+        df = df.assign(**{KEY_COLUMN: None})
+    
+    keys = df[KEY_COLUMN].fillna(df['File ID'].map(dict(zip(new_df['File ID'], new_df[KEY_COLUMN]))))
+    df = df.assign(**{KEY_COLUMN: keys})
+    updates = new_df.set_index(KEY_COLUMN)
+    matched = keys.isin(updates.index)
+    df.loc[matched, ['File Name', 'File ID']] = updates.loc[keys[matched], ['File Name', 'File ID']].to_numpy()
+    
+    appended = new_df[~new_df[KEY_COLUMN].isin(keys)]
+    return pd.concat([df, appended], ignore_index=True)
+
+
+def write_index(df, path):
+    """Atomically write the index CSV, so readers never see a partial file."""
+    atomic_write(path, lambda temp_path: df.to_csv(temp_path, index=False))
+
+
+async def main(incremental=False, output_csv=OUTPUT_CSV):
     print("=" * 60)
     print("IMPORTANT: Enter your PHONE NUMBER, NOT the bot token!")
     print("Format: +1234567890 (with country code)")
@@ -58,9 +143,14 @@ async def main():
     
     print(f"\n✓ Logged in as: {me.first_name} {me.last_name or ''} (@{me.username or 'no username'})")
     
-    # Load your current CSV
-    df = pd.read_csv(INPUT_CSV)
+    # Load the index to update: the previous output in incremental mode
+    if incremental and os.path.exists(output_csv):
+        df = pd.read_csv(output_csv, dtype={KEY_COLUMN: str})
+    else:
+        df = pd.read_csv(INPUT_CSV) if os.path.exists(INPUT_CSV) else pd.DataFrame()
     new_data = []
+    unsaved = []  # Rows of new_data not yet written to output_csv
+    last_message_id = load_checkpoint(output_csv) if incremental else 0
     
     print("Connecting to channel...")
     try:
@@ -91,16 +181,22 @@ async def main():
         return
     
     print("Fetching Bot-API compatible IDs from your channel...")
-    print("This may take a while if the channel has many messages...\n")
-    
-    # Load existing CSV to match filenames (optional - for verification)
-    existing_files = set(df['File Name'].tolist()) if not df.empty else set()
+    if incremental:
+        print(f"Only messages after #{last_message_id} (checkpoint: {checkpoint_path(output_csv)})\n")
+        # Oldest first, so an interrupted run can resume from the checkpoint
+        messages = client.iter_messages(entity, min_id=last_message_id, reverse=True)
+    else:
+        print("This may take a while if the channel has many messages...\n")
+        # Limit to 10000 messages to avoid timeout (adjust if needed)
+        messages = client.iter_messages(entity, limit=10000)
     
     count = 0
+    seen = 0
+    newest_message_id = last_message_id
     # We iterate through the channel messages to get the 'Bot API' version of the ID
-    # Limit to 10000 messages to avoid timeout (adjust if needed)
     print(f"\n📥 Fetching messages from channel...")
-    async for message in client.iter_messages(entity, limit=10000):
+    async for message in messages:
+        newest_message_id = max(newest_message_id, message.id)
         if message.document:
             # This is the magic part: Telethon packs the ID into the Bot API format
             bot_api_id = utils.pack_bot_file_id(message.document)
@@ -108,7 +204,9 @@ async def main():
             # Get the filename
             filename = message.file.name if message.file.name else f"file_{count}.pdf"
             
-            new_data.append({"File Name": filename, "File ID": bot_api_id})
+            row = {"File Name": filename, "File ID": bot_api_id, KEY_COLUMN: str(message.document.id)}
+            new_data.append(row)
+            unsaved.append(row)
             count += 1
             
             # Show progress
@@ -116,20 +214,50 @@ async def main():
                 print(f"Processed {count} files...", end='\r')
             else:
                 print(f"✓ {filename[:50]}...")
+        
+        seen += 1
+        if incremental and seen % CHECKPOINT_EVERY == 0:
+            # Messages come oldest first: save what we have so a rerun resumes here
+            if unsaved:
+                df = upsert_rows(df, unsaved)
+                write_index(df, output_csv)
+                unsaved = []
+            save_checkpoint(output_csv, newest_message_id)
     
     print(f"\n\nProcessed {count} files total.")
 
     # Save the new compatible CSV
     if new_data:
-        new_df = pd.DataFrame(new_data)
-        new_df.to_csv(OUTPUT_CSV, index=False)
+        if not incremental:
+            new_df = pd.DataFrame(new_data)
+        else:
+            new_df = upsert_rows(df, unsaved) if unsaved else df
+        write_index(new_df, output_csv)
         print(f"\n✅ Success! Found {len(new_data)} files.")
-        print(f"📁 New CSV saved as: '{OUTPUT_CSV}'")
-        print(f"💡 Replace 'master_index.csv' with '{OUTPUT_CSV}' in your Streamlit app.")
+        print(f"📁 New CSV saved as: '{output_csv}' ({len(new_df)} files)")
+        if output_csv != INPUT_CSV:
+            print(f"💡 Replace 'master_index.csv' with '{output_csv}' in your Streamlit app.")
+    elif incremental:
+        print("\n✅ Index is up to date; no new files since the last run.")
     else:
         print("\n⚠️  No files found in the channel. Make sure:")
         print("   - The channel has messages with documents")
         print("   - Your bot has access to the channel")
+    
+    # Only advance the checkpoint once the index is safely written
+    if (new_data or incremental) and newest_message_id > last_message_id:
+        save_checkpoint(output_csv, newest_message_id)
+
 
-with client:
-    client.loop.run_until_complete(main())
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Bot API compatible index of the channel's files.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only fetch messages newer than the output CSV's checkpoint "
+                             f"(<output>{CHECKPOINT_SUFFIX}) and upsert them into it")
+    parser.add_argument('--output', default=OUTPUT_CSV,
+                        help=f"CSV to write (default: {OUTPUT_CSV}); pass {INPUT_CSV} to update the live index, "
+                             "which the app reloads automatically")
+    args = parser.parse_args()
+    
+    with client:
+        client.loop.run_until_complete(main(incremental=args.incremental, output_csv=args.output))
\ No newline at end of file
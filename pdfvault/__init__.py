@@ -0,0 +1,38 @@
+"""
+Search and download core of the Past Paper Vault, without any UI
+
+    from pdfvault import load_master_index, SearchIndex, fuzzy_search
+
+Importing the package is cheap: each name below is imported from its
+submodule on first use, so e.g. ``pdfvault.normalize_text`` does not load
+pandas, NumPy or requests.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'text': ['sanitize_filename', 'normalize_text', 'normalize_many', 'build_search_features'],
+    'index': ['load_master_index', 'read_master_csv', 'SearchIndex', 'IndexStore'],
+    'search': ['fuzzy_search', 'SearchResultCache'],
+    'shards': ['ShardedSearch'],
+    'facets': ['FacetIndex'],
+    'cache': ['PdfCache', 'FilePathCache'],
+    'telegram': ['TelegramClient', 'RequestScheduler', 'get_telegram_file_content', 'fetch_pdf'],
+    'downloads': ['Prefetcher', 'build_zip_bundle'],
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
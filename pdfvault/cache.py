@@ -0,0 +1,218 @@
+"""
+Process-wide caches: downloaded PDFs on disk and Telegram getFile results
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+# On-disk PDF cache shared by all sessions
+PDF_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pdfvault-cache')
+PDF_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Part files untouched for this long were left behind by an interrupted write;
+# younger ones may be another process's download in progress
+STALE_PART_SECONDS = 60 * 60
+
+
+class PdfCache:
+    """Size-bounded on-disk LRU cache of downloaded PDFs, keyed by Telegram file ID.
+
+    Files are written to a temporary name and moved into place with
+    os.replace, so readers never see a partial PDF. Access times are kept in
+    the file mtimes, so a restarted process resumes the same LRU order, and
+    files stored by another process sharing the directory are picked up on
+    first read.
+    """
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name, stat.st_size))
+            elif entry.name.endswith('.part'):
+                try:
+                    if time.time() - entry.stat().st_mtime > STALE_PART_SECONDS:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        for _, name, size in sorted(existing):
+            self._entries[name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __contains__(self, file_id):
+        return self._name(file_id) in self._entries
+
+    def _name(self, file_id):
+        return hashlib.sha1(str(file_id).encode('utf-8')).hexdigest() + '.pdf'
+
+    def _evict(self):
+        """Drop least recently used files until the cache fits its byte budget."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name):
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is not None:
+                self._total_bytes -= size
+
+    def path(self, file_id):
+        """Return the path of the cached file for ``file_id``, or None if it is not cached."""
+        name = self._name(file_id)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name not in self._entries:
+                # Another process sharing the directory may have stored it
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.misses += 1
+                    return None
+                self._entries[name] = size
+                self._total_bytes += size
+            self._entries.move_to_end(name)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed behind our back; forget it
+            self._forget(name)
+            return None
+        return path
+
+    def read(self, file_id):
+        """Return the cached bytes for ``file_id``, or None if it is not cached."""
+        path = self.path(file_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            self._forget(os.path.basename(path))
+            return None
+
+    def open_part(self):
+        """Return ``(file, temp_path)`` for writing a new file into the cache directory.
+
+        Pass the path to commit once the file is complete, or to discard to
+        throw it away; partial files are never visible to readers.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        return os.fdopen(fd, 'wb'), temp_path
+
+    def commit(self, file_id, temp_path):
+        """Move a finished part file into the cache as ``file_id``.
+
+        Returns False (and removes the part file) if it exceeds the byte budget.
+        """
+        size = os.path.getsize(temp_path)
+        if size > self.max_bytes:
+            self.discard(temp_path)
+            return False
+        name = self._name(file_id)
+        os.replace(temp_path, os.path.join(self.directory, name))
+        with self._lock:
+            previous = self._entries.pop(name, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[name] = size
+            self._total_bytes += size
+            self._evict()
+        return True
+
+    def discard(self, temp_path):
+        """Remove a part file that will not be committed."""
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def put(self, file_id, content):
+        """Atomically store ``content`` for ``file_id``, evicting old files if needed."""
+        if len(content) > self.max_bytes:
+            return
+        part, temp_path = self.open_part()
+        try:
+            with part:
+                part.write(content)
+            self.commit(file_id, temp_path)
+        finally:
+            self.discard(temp_path)
+
+
+# Telegram download links stay valid for about an hour
+FILE_PATH_TTL = 55 * 60
+
+
+class FilePathCache:
+    """Process-wide TTL cache of Telegram getFile results, keyed by file ID.
+
+    Each entry is the ``result`` object returned by getFile (``file_path``,
+    ``file_size``, ...). Hits skip one Bot API round trip per download.
+    """
+
+    def __init__(self, ttl=FILE_PATH_TTL, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_id):
+        """Return the cached getFile result for ``file_id`` if it has not expired."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(file_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, file_id, file_info):
+        with self._lock:
+            self._entries[file_id] = (time.monotonic(), file_info)
+            self._entries.move_to_end(file_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, file_id):
+        with self._lock:
+            self._entries.pop(file_id, None)
+
+
+def hit_rate(cache):
+    """Return a cache's hit rate as a percentage string."""
+    lookups = cache.hits + cache.misses
+    return f"{100.0 * cache.hits / lookups:.1f}%" if lookups else "—"
@@ -0,0 +1,206 @@
+"""
+Background prefetching of likely downloads and ZIP bundles of search results
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from .text import sanitize_filename
+from .telegram import fetch_pdf, DOWNLOAD_CHUNK_SIZE, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+
+
+# Background prefetch of the most likely picks; kept small so a burst of
+# searches cannot flood the Bot API
+PREFETCH_COUNT = 3
+PREFETCH_WORKERS = 2
+PREFETCH_POLL_SECONDS = 1
+
+
+class Prefetcher:
+    """Downloads files into the PDF cache ahead of a click.
+    
+    Prefetches run on a bounded thread pool. Each file ID has at most one
+    download in flight across all sessions: later requests for the same file,
+    including an interactive click, wait on the download already running. A
+    click on a file still queued behind other prefetches takes the download
+    over and runs it at once, resolving the same future for every waiter.
+    """
+
+    def __init__(self, cache, max_workers=PREFETCH_WORKERS, client=None, path_cache=None):
+        self.cache = cache
+        self.client = client
+        self.path_cache = path_cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-prefetch')
+        self._inflight = {}  # file ID -> Future resolving to fetch_pdf's error
+        self._queued = {}  # file ID -> Future of a download not yet picked up by a worker
+        self._lock = threading.Lock()
+
+    def _download(self, file_id, bot_token, fallback_ids=(), priority=PRIORITY_PREFETCH, on_wait=None):
+        try:
+            return fetch_pdf(file_id, bot_token, self.cache, self.client, self.path_cache, priority, on_wait,
+                             fallback_ids)
+        finally:
+            with self._lock:
+                self._inflight.pop(file_id, None)
+
+    def _resolve(self, future, file_id, bot_token, fallback_ids, priority, on_wait=None):
+        try:
+            error = self._download(file_id, bot_token, fallback_ids, priority, on_wait)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(error)
+        return error
+
+    def _run_queued(self, future, file_id, bot_token, fallback_ids):
+        with self._lock:
+            if self._queued.get(file_id) is not future:
+                return  # Taken over by an interactive fetch
+            del self._queued[file_id]
+        self._resolve(future, file_id, bot_token, fallback_ids, PRIORITY_PREFETCH)
+
+    def pending(self, file_id):
+        """True while a download of ``file_id`` is queued or running."""
+        with self._lock:
+            return file_id in self._inflight
+
+    def submit(self, file_id, bot_token, fallback_ids=()):
+        """Queue a background download of ``file_id`` and return its future.
+        
+        The future resolves to fetch_pdf's error (None on success); files that
+        are already cached get a future that is already done.
+        """
+        with self._lock:
+            future = self._inflight.get(file_id)
+            if future is None:
+                if file_id in self.cache:
+                    future = Future()
+                    future.set_result(None)
+                else:
+                    future = self._inflight[file_id] = self._queued[file_id] = Future()
+                    self._executor.submit(self._run_queued, future, file_id, bot_token, fallback_ids)
+            return future
+
+    def prefetch(self, file_ids, bot_token, fallbacks=None):
+        """Queue background downloads for files that are not cached or in flight.
+        
+        ``fallbacks`` optionally maps file IDs to the IDs of their other copies.
+        """
+        for file_id in file_ids:
+            self.submit(file_id, bot_token, (fallbacks or {}).get(file_id, ()))
+
+    def fetch(self, file_id, bot_token, on_wait=None, fallback_ids=()):
+        """Download ``file_id`` now, joining a download already in flight.
+        
+        The download is scheduled ahead of prefetches, with ``on_wait``
+        receiving queue feedback. Returns an error message, or None once the
+        file is cached.
+        """
+        with self._lock:
+            future = self._inflight.get(file_id)
+            if future is None:
+                # Run in the caller's thread rather than queueing behind prefetches
+                future = self._inflight[file_id] = Future()
+                owner = True
+            else:
+                # Not started yet: take it over instead of waiting for a worker
+                owner = self._queued.pop(file_id, None) is not None
+        if not owner:
+            return future.result()
+        return self._resolve(future, file_id, bot_token, fallback_ids, PRIORITY_INTERACTIVE, on_wait)
+
+
+BUNDLE_DIR = os.path.join(tempfile.gettempdir(), 'pdfvault-bundles')
+# Bundles older than this are deleted; sessions that are simply closed never discard theirs
+BUNDLE_MAX_AGE = 60 * 60
+
+
+def sweep_bundles(max_age=BUNDLE_MAX_AGE, directory=BUNDLE_DIR):
+    """Delete ZIP bundles in ``directory`` not modified for ``max_age`` seconds."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith('.zip') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def bundle_entry_name(file_name, file_id, used):
+    """Return a unique ``.pdf`` name for a file inside a ZIP bundle."""
+    name = sanitize_filename(file_name).replace('/', '_').replace('\\', '_')
+    if name.lower().endswith('.pdf'):
+        name = name[:-4]
+    name = name or str(file_id)
+    candidate = f"{name}.pdf"
+    count = 1
+    while candidate.lower() in used:
+        count += 1
+        candidate = f"{name} ({count}).pdf"
+    used.add(candidate.lower())
+    return candidate
+
+
+def build_zip_bundle(files, bot_token, prefetcher, progress=None):
+    """Bundle ``files`` (a list of ``(file_id, file_name, fallback_ids)``) into a ZIP on disk.
+    
+    Files are fetched through the prefetcher's shared, bounded pool, so cached
+    files are reused and in-flight downloads are shared with other sessions.
+    Each file is copied into the archive in chunks straight from the PDF cache
+    as soon as it arrives. PDFs are already compressed, so entries are stored
+    as-is. Files that fail are listed in FAILED.txt inside the archive instead
+    of aborting the bundle.
+    
+    Returns (zip_path, failures) where failures is a list of (name, error).
+    Bundles older than BUNDLE_MAX_AGE are swept first.
+    """
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    sweep_bundles()
+    fd, zip_path = tempfile.mkstemp(dir=BUNDLE_DIR, suffix='.zip')
+    os.close(fd)
+    
+    used = set()
+    futures = {}
+    for file_id, file_name, fallbacks in files:
+        name = bundle_entry_name(file_name, file_id, used)
+        futures[prefetcher.submit(file_id, bot_token, fallbacks)] = (file_id, name)
+    
+    failures = []
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as bundle:
+            for done, future in enumerate(as_completed(futures), start=1):
+                file_id, name = futures[future]
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = f"❌ Error downloading file: {str(e)}"
+                path = prefetcher.cache.path(file_id) if error is None else None
+                if error is None and path is None:
+                    error = "❌ File was removed from the cache before it could be bundled."
+                if path is not None:
+                    try:
+                        with open(path, 'rb') as source, bundle.open(name, 'w') as target:
+                            shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+                    except FileNotFoundError:
+                        error = "❌ File was removed from the cache before it could be bundled."
+                if error is not None:
+                    failures.append((name, error))
+                if progress is not None:
+                    progress(done, len(futures))
+            
+            if failures:
+                report = "\n".join(f"{name}: {error}" for name, error in sorted(failures))
+                bundle.writestr("FAILED.txt", report + "\n")
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    return zip_path, failures
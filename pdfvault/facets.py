@@ -0,0 +1,149 @@
+"""
+Facet filters and counts over the master index, as packed bitsets
+"""
+
+import threading
+
+import numpy as np
+
+
+# Facet -> chip label -> the normalized filename words that select it.
+# Years are added per index from the years found in the filenames.
+FACETS = {
+    'Year': {},
+    'Level': {'A/L': ['al', 'a/l'], 'O/L': ['ol', 'o/l'], 'Grade': ['grade']},
+    'Subject': {
+        'Physics': ['physics'], 'Chemistry': ['chemistry', 'chem'], 'Biology': ['biology', 'bio'],
+        'Maths': ['mathematics', 'maths', 'math'], 'Combined Maths': ['combined'],
+        'Commerce': ['commerce'], 'History': ['history'], 'Geography': ['geography', 'geo'],
+        'Economics': ['economics', 'econ'], 'Accounting': ['accounting', 'accounts'],
+        'Science': ['science'], 'ICT': ['ict'], 'Technology': ['technology'],
+        'Buddhism': ['buddhism'], 'Hinduism': ['hinduism'], 'Islam': ['islam'],
+        'Christianity': ['christianity'], 'Art': ['art'], 'Music': ['music'], 'Drama': ['drama'],
+        'Dancing': ['dancing'], 'Agriculture': ['agriculture', 'agri'], 'Business': ['business'],
+        'Botany': ['botany'], 'Zoology': ['zoology'], 'Logic': ['logic'],
+        'Statistics': ['statistics', 'stats'], 'Political Science': ['political'],
+        'SFT': ['sft'], 'GIT': ['git'], 'EGT': ['egt'], 'BST': ['bst'], 'EST': ['est'],
+        'General Knowledge': ['general', 'knowledge', 'gk'],
+    },
+    'Medium': {'Sinhala': ['sinhala'], 'Tamil': ['tamil'], 'English': ['english']},
+    'Doc Type': {
+        # Not 'paper' alone, which model papers and term test papers have too
+        'Past Paper': ['past', 'pastpaper'], 'Model Paper': ['model'],
+        'Marking Scheme': ['marking', 'scheme'], 'MCQ': ['mcq'], 'Essay': ['essay'],
+    },
+}
+
+
+# Chip count tables kept per FacetIndex, one per recent filter selection
+COUNTS_CACHE_SIZE = 64
+
+
+if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+    def popcount(bits):
+        """Number of set bits in each row of a packed bitset (or stack of them)."""
+        return np.bitwise_count(bits.view(np.uint64)).sum(axis=-1, dtype=np.int64)
+else:
+    BYTE_BIT_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+    def popcount(bits):
+        """Number of set bits in each row of a packed bitset (or stack of them)."""
+        return BYTE_BIT_COUNTS[bits].sum(axis=-1, dtype=np.int64)
+
+
+def filter_key(filters):
+    """Hashable form of a ``{facet: labels}`` selection, ignoring empty facets."""
+    if not filters:
+        return ()
+    return tuple(sorted((facet, tuple(sorted(labels))) for facet, labels in filters.items() if labels))
+
+
+class FacetIndex:
+    """One packed bitset per facet value of a SearchIndex.
+
+    Bit ``i`` of a value's bitset is set when row ``i`` has that value, so a
+    filter is an OR of the selected values within each facet and an AND
+    across facets, and a count is a popcount. The bitsets of all values are
+    stacked in ``bits`` (one row each, padded to whole 64-bit words), which
+    lets ``counts`` score every chip with a single AND and popcount. Counts
+    without filters are computed once here, and recent selections are
+    memoized, since every rerun of the UI asks for the same counts again;
+    the memo is shared by every session, so it is only touched under a lock.
+    """
+
+    def __init__(self, postings, year_postings, size):
+        self.size = size
+        self.words = -(-size // 64)
+        self.all = self._pack(np.ones(size, dtype=bool))
+
+        # Facet -> {label: row in bits}, only for values present in the index
+        self.slots = {}
+        packed = []
+        for facet, groups in FACETS.items():
+            if facet == 'Year':
+                groups = {year: [year] for year in sorted(year_postings, reverse=True)}
+                source = year_postings
+            else:
+                source = postings
+            self.slots[facet] = {}
+            for label, words in groups.items():
+                lists = [source[word] for word in words if word in source]
+                if not lists:
+                    continue
+                rows = np.zeros(size, dtype=bool)
+                for positions in lists:
+                    rows[positions] = True
+                self.slots[facet][label] = len(packed)
+                packed.append(self._pack(rows))
+        self.bits = np.array(packed, dtype=np.uint8).reshape(len(packed), self.words * 8)
+        self.totals = popcount(self.bits)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _pack(self, rows):
+        bits = np.zeros(self.words * 8, dtype=np.uint8)
+        packed = np.packbits(rows)
+        bits[:len(packed)] = packed
+        return bits
+
+    def mask(self, filters):
+        """Packed bitset of the rows passing ``filters`` (``{facet: labels}``)."""
+        mask = self.all
+        for facet, labels in (filters or {}).items():
+            if not labels:
+                continue
+            slots = [self.slots.get(facet, {})[label] for label in labels if label in self.slots.get(facet, {})]
+            if not slots:
+                return np.zeros_like(self.all)
+            mask = mask & np.bitwise_or.reduce(self.bits[slots], axis=0)
+        return mask
+
+    def rows(self, filters):
+        """Boolean array over the index rows, True for rows passing ``filters``."""
+        return np.unpackbits(self.mask(filters), count=self.size).view(bool)
+
+    def count(self, filters):
+        """Number of rows passing ``filters``."""
+        return int(popcount(self.mask(filters)))
+
+    def counts(self, filters=None):
+        """Return ``{facet: {label: rows}}`` for every facet value.
+
+        Each facet is counted under the other facets' filters only, so the
+        counts of a facet's chips stay visible while some of them are selected.
+        """
+        key = filter_key(filters)
+        with self._lock:
+            counts = self._counts.get(key)
+        if counts is None:
+            counts = {}
+            for facet, slots in self.slots.items():
+                others = {other: labels for other, labels in key if other != facet}
+                rows = list(slots.values())
+                values = popcount(self.bits[rows] & self.mask(others)) if others else self.totals[rows]
+                counts[facet] = dict(zip(slots, (int(value) for value in values)))
+            with self._lock:
+                while len(self._counts) >= COUNTS_CACHE_SIZE:
+                    self._counts.pop(next(iter(self._counts)))
+                self._counts[key] = counts
+        return {facet: dict(labels) for facet, labels in counts.items()}
@@ -0,0 +1,668 @@
+"""
+Master index loading, the binary index snapshot and the SearchIndex
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, fuzz
+
+from .text import (
+    sanitize_filename, normalize_text, build_search_features,
+    SUBJECTS, MEDIUMS, LEVELS, DOC_TYPES, FEATURE_COLUMNS,
+)
+from .facets import FacetIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+MASTER_INDEX_CSV = 'master_index.csv'
+# Bump whenever the snapshot layout or the search features change
+SNAPSHOT_FORMAT = 5
+# Feature columns holding sets of words, stored flattened in the snapshot
+SET_FEATURE_COLUMNS = ['Tokens', 'Years', 'Subjects', 'Mediums', 'Levels', 'Doc Types']
+
+
+# " (1)", " (2)"... added to the name of a file uploaded again
+# ' (1)' to ' (99)' before the extension; larger numbers like ' (2019)' are part of the name
+COPY_SUFFIX_PATTERN = re.compile(r'\s\((?:[1-9]|[1-9]\d)\)(?=\.pdf$|$)', re.IGNORECASE)
+
+
+def normalize_file_name(file_name):
+    """Casefolded file name with its whitespace collapsed."""
+    return ' '.join(str(file_name).casefold().split())
+
+
+def canonical_name(file_name):
+    """Casefolded file name without its copy suffix, shared by every upload of a paper."""
+    return normalize_file_name(COPY_SUFFIX_PATTERN.sub('', str(file_name)))
+
+
+def collapse_duplicates(df):
+    """Keep one row per paper, with the file IDs of its other copies as fallbacks.
+
+    Rows are grouped by canonical_name and, when the index has one, by
+    'Document ID' (the same upload under another name). A name with a copy
+    suffix only joins the group of its original when the unsuffixed name is
+    in the index too; otherwise the suffix may be part of the title and the
+    row stands alone. The primary row is
+    the first one without a copy suffix, or else the first in the group; it
+    keeps its position and gets the group's other file IDs, space-separated,
+    in a 'Fallback IDs' column.
+    """
+    if df.empty or not {'File Name', 'File ID'} <= set(df.columns):
+        return df
+    names = df['File Name'].fillna('').astype(str)
+    is_copy = names.str.contains(COPY_SUFFIX_PATTERN)
+    keys = names.map(canonical_name)
+    keys = keys.where(~is_copy | keys.isin(set(keys[~is_copy])), names.map(normalize_file_name))
+    if 'Document ID' in df.columns:
+        documents = df['Document ID']
+        keys = keys.groupby(documents).transform('first').where(documents.notna(), keys)
+    
+    # Originals sort ahead of their copies; the first row of each group is the primary
+    keys = keys.to_numpy()
+    groups = pd.DataFrame({
+        'key': keys,
+        'copy': is_copy.to_numpy(),
+        'id': df['File ID'].astype(str).to_numpy(),
+    }).sort_values('copy', kind='stable')
+    is_primary = ~groups['key'].duplicated()
+    primary = groups[is_primary]
+    copies = groups[~is_primary]
+    copies = copies[copies['id'] != copies['key'].map(dict(zip(primary['key'], primary['id'])))]
+    fallbacks = copies.drop_duplicates(['key', 'id']).groupby('key', sort=False)['id'].agg(' '.join)
+    
+    rows = np.sort(primary.index.to_numpy())
+    collapsed = df.iloc[rows].reset_index(drop=True)
+    collapsed['Fallback IDs'] = pd.Series(keys[rows]).map(fallbacks).fillna('').astype(str)
+    return collapsed
+
+
+def fallback_ids(row):
+    """Return the fallback file IDs stored on an index row."""
+    value = row.get('Fallback IDs')
+    return tuple(str(value).split()) if isinstance(value, str) else ()
+
+
+def add_display_names(df):
+    """Add the names shown on result tiles and used for downloads.
+
+    'Display Name' is the sanitized file name with '_' and '-' as spaces;
+    'Download Name' is the sanitized file name, always ending in '.pdf'. They
+    only depend on the row, so they are built once per index load.
+    """
+    if df.empty or 'File Name' not in df.columns:
+        return df
+    cleaned = [sanitize_filename(name) for name in df['File Name'].fillna('').astype(str)]
+    return df.assign(**{
+        'Display Name': [name.replace('_', ' ').replace('-', ' ') for name in cleaned],
+        'Download Name': [name if name.lower().endswith('.pdf') else f"{name}.pdf" for name in cleaned],
+    })
+
+
+def read_master_csv(csv_path):
+    """Read the master index CSV, map its columns to 'File Name' / 'File ID',
+    collapse duplicate copies and add the display names."""
+    # Document IDs are 64-bit; as floats (any missing value) they would lose precision
+    df = pd.read_csv(csv_path, dtype={'Document ID': str})
+    df.columns = df.columns.str.strip()
+    
+    # Normalize column names
+    column_mapping = {}
+    for col in df.columns:
+        col_lower = col.lower().strip()
+        if 'file' in col_lower and 'name' in col_lower:
+            column_mapping[col] = 'File Name'
+        elif 'file' in col_lower and 'id' in col_lower:
+            column_mapping[col] = 'File ID'
+    
+    if column_mapping:
+        df = df.rename(columns=column_mapping)
+    
+    # Ensure required columns exist
+    if 'File Name' not in df.columns and len(df.columns) >= 1:
+        df = df.rename(columns={df.columns[0]: 'File Name'})
+    if 'File ID' not in df.columns and len(df.columns) >= 2:
+        df = df.rename(columns={df.columns[1]: 'File ID'})
+    
+    return add_display_names(collapse_duplicates(df))
+
+
+def file_signature(path):
+    """Return (size, mtime_ns) of ``path``; a snapshot records the CSV's signature."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def encode_strings(values):
+    """Pack strings into (utf8_bytes, offsets) arrays; offsets count characters."""
+    values = list(values)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in values])
+    return np.frombuffer(''.join(values).encode('utf-8'), dtype=np.uint8), offsets
+
+
+def decode_strings(data, offsets):
+    """Unpack the strings packed by encode_strings into a list."""
+    text = data.tobytes().decode('utf-8')
+    offsets = offsets.tolist()
+    return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def encode_sets(values):
+    """Pack a column of word sets as (vocabulary, codes, offsets, rows) arrays.
+
+    Equal sets are stored once: ``codes[offsets[i]:offsets[i + 1]]`` are the
+    vocabulary positions of the i-th distinct set, and ``rows`` maps each row
+    to its distinct set.
+    """
+    vocabulary = {}
+    distinct = {}
+    codes = []
+    offsets = [0]
+    rows = np.empty(len(values), dtype=np.int32)
+    for position, row in enumerate(values):
+        code = distinct.get(row)
+        if code is None:
+            code = distinct[row] = len(distinct)
+            codes.extend(vocabulary.setdefault(word, len(vocabulary)) for word in sorted(row))
+            offsets.append(len(codes))
+        rows[position] = code
+    return (*encode_strings(vocabulary),
+            np.array(codes, dtype=np.int32), np.array(offsets, dtype=np.int64), rows)
+
+
+def decode_sets(vocabulary_data, vocabulary_offsets, codes, offsets, rows):
+    """Rebuild the frozensets packed by encode_sets; equal rows share one set."""
+    words = decode_strings(vocabulary_data, vocabulary_offsets)
+    codes = codes.tolist()
+    offsets = offsets.tolist()
+    distinct = np.empty(len(offsets) - 1, dtype=object)
+    for i, (start, end) in enumerate(zip(offsets, offsets[1:])):
+        distinct[i] = frozenset([words[code] for code in codes[start:end]])
+    return pd.Series(distinct[rows], dtype=object)
+
+
+def write_index_snapshot(df, path, source):
+    """Atomically write ``df`` (records plus search features) as a .npz snapshot.
+
+    ``source`` is the file_signature of the CSV the frame was built from.
+    """
+    columns = [col for col in df.columns if col not in FEATURE_COLUMNS]
+    arrays = {
+        'format': np.array(SNAPSHOT_FORMAT),
+        'source': np.array(source, dtype=np.int64),
+    }
+    arrays['columns'], arrays['columns_offsets'] = encode_strings(columns)
+    arrays['names'], arrays['names_offsets'] = encode_strings(df['Normalized Name'])
+    for i, col in enumerate(columns):
+        values = df[col]
+        arrays[f'missing_{i}'] = values.isna().to_numpy()
+        if pd.api.types.is_numeric_dtype(values):
+            arrays[f'column_{i}'] = values.to_numpy()
+        else:
+            arrays[f'column_{i}'], arrays[f'column_{i}_offsets'] = encode_strings(values.fillna('').astype(str))
+    for i, col in enumerate(SET_FEATURE_COLUMNS):
+        (arrays[f'set_{i}_vocabulary'], arrays[f'set_{i}_vocabulary_offsets'],
+         arrays[f'set_{i}_codes'], arrays[f'set_{i}_offsets'], arrays[f'set_{i}_rows']) = encode_sets(df[col])
+    
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def save_index_snapshot(df, path, source):
+    """write_index_snapshot, skipped on read-only checkouts (features are extracted again next load)."""
+    try:
+        write_index_snapshot(df, path, source)
+    except OSError:
+        pass
+
+
+def read_index_snapshot(path, source):
+    """Load a snapshot written by write_index_snapshot.
+
+    Returns None if the snapshot is missing, unreadable, in another
+    SNAPSHOT_FORMAT, or was built from a CSV other than the one whose
+    file_signature is ``source``.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as snapshot:
+            if int(snapshot['format']) != SNAPSHOT_FORMAT or tuple(snapshot['source'].tolist()) != tuple(source):
+                return None
+            data = {}
+            for i, col in enumerate(decode_strings(snapshot['columns'], snapshot['columns_offsets'])):
+                if f'column_{i}_offsets' in snapshot:
+                    values = pd.Series(decode_strings(snapshot[f'column_{i}'], snapshot[f'column_{i}_offsets']))
+                else:
+                    values = pd.Series(snapshot[f'column_{i}'])
+                missing = snapshot[f'missing_{i}']
+                if missing.any():
+                    values = values.where(~missing)
+                data[col] = values
+            data['Normalized Name'] = pd.Series(decode_strings(snapshot['names'], snapshot['names_offsets']))
+            for i, col in enumerate(SET_FEATURE_COLUMNS):
+                data[col] = decode_sets(*(snapshot[f'set_{i}_{part}'] for part in
+                                          ('vocabulary', 'vocabulary_offsets', 'codes', 'offsets', 'rows')))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+    return pd.DataFrame(data)
+
+
+def default_snapshot_path(csv_path):
+    """Return where the snapshot of ``csv_path`` lives: next to it, as ``.npz``."""
+    return os.path.splitext(csv_path)[0] + '.npz'
+
+
+def load_master_index(csv_path=MASTER_INDEX_CSV, snapshot_path=None):
+    """Load the master index and its precomputed search features.
+
+    Reads the binary snapshot (``snapshot_path``, by default next to the CSV)
+    when it was built from the current CSV; otherwise parses the CSV, extracts
+    the features and rewrites the snapshot for the next load. Raises
+    FileNotFoundError when the CSV is missing.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+    source = file_signature(csv_path)
+    df = read_index_snapshot(snapshot_path, source)
+    if df is None:
+        df = read_master_csv(csv_path)
+        
+        # Precompute search features once per load
+        df = pd.concat([df, build_search_features(df)], axis=1)
+        save_index_snapshot(df, snapshot_path, source)
+    
+    return df
+
+
+def find_file_name_column(df):
+    """Return the column holding file names, falling back to the first column.
+
+    A frame without columns (no master index loaded) gets 'File Name'.
+    """
+    for col in df.columns:
+        if 'file' in col.lower() and 'name' in col.lower():
+            return col
+    return df.columns[0] if len(df.columns) else 'File Name'
+
+
+def build_postings(values):
+    """Build an inverted index mapping each token to the sorted row positions containing it."""
+    postings = {}
+    for position, tokens in enumerate(values):
+        for token in tokens:
+            postings.setdefault(token, []).append(position)
+    return {token: np.asarray(rows, dtype=np.int64) for token, rows in postings.items()}
+
+
+# Bit assigned to each medium / doc type in SearchIndex flag arrays
+MEDIUM_BITS = {medium: 1 << bit for bit, medium in enumerate(sorted(MEDIUMS))}
+DOC_TYPE_BITS = {doc_type: 1 << bit for bit, doc_type in enumerate(sorted(DOC_TYPES))}
+
+# Padding for rows with fewer years than the widest row in the year matrix
+NO_YEAR = 1_000_000
+
+# Minimum rapidfuzz score (0-100) for typo corrections and typo fallback matches
+TYPO_SCORE_CUTOFF = 80
+
+# Number of query completions offered under the search box
+SUGGESTION_LIMIT = 4
+
+
+def encode_flags(values, bits):
+    """Encode a set of vocabulary words as a bitmask."""
+    flags = 0
+    for value in values:
+        flags |= bits.get(value, 0)
+    return flags
+
+
+def row_hashes(records):
+    """Return one content hash per row of ``records``."""
+    return pd.util.hash_pandas_object(records, index=False).to_numpy()
+
+
+def index_version(records, hashes=None):
+    """Return a short content hash identifying one build of the master index."""
+    if hashes is None:
+        hashes = row_hashes(records)
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+
+def row_keys(hashes):
+    """Identify rows by (content hash, occurrence) so duplicate rows stay distinct."""
+    occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return pd.MultiIndex.from_arrays([hashes, occurrence])
+
+
+def build_year_matrix(years):
+    """Each row's years as sorted integers, padded with NO_YEAR to a common width."""
+    width = max((len(row_years) for row_years in years), default=0)
+    year_matrix = np.full((len(years), max(width, 1)), NO_YEAR, dtype=np.int32)
+    for position, row_years in enumerate(years):
+        year_matrix[position, :len(row_years)] = sorted(int(year) for year in row_years)
+    return year_matrix
+
+
+def remap_postings(postings, remap, first_changed):
+    """Move postings to new row positions (``remap``; -1 drops a row).
+
+    Posting lists that end before ``first_changed`` are shared unchanged.
+    """
+    remapped = {}
+    for token, rows in postings.items():
+        if rows[-1] < first_changed:
+            remapped[token] = rows
+            continue
+        rows = remap[rows]
+        rows = rows[rows >= 0]
+        if len(rows):
+            remapped[token] = rows
+    return remapped
+
+
+def merge_postings(postings, added):
+    """Merge the posting lists of added rows into ``postings`` (a new dict)."""
+    merged = dict(postings)
+    for token, rows in added.items():
+        existing = merged.get(token)
+        if existing is None:
+            merged[token] = rows
+        elif existing[-1] < rows[0]:
+            merged[token] = np.concatenate([existing, rows])
+        else:
+            merged[token] = np.sort(np.concatenate([existing, rows]))
+    return merged
+
+
+class SearchIndex:
+    """Master index DataFrame plus the derived structures used by fuzzy_search.
+
+    ``postings`` maps every normalized filename token (subjects, levels,
+    mediums, doc types and plain words) to the row positions containing it,
+    and ``year_postings`` does the same for the years parsed from each name.
+    Candidate selection is then a union of posting lists, so its cost scales
+    with the number of matching papers rather than the size of the index.
+
+    The remaining per-row features are held as NumPy arrays so the sort keys
+    can be computed for all candidates at once: ``year_matrix`` holds each
+    row's years padded with NO_YEAR, ``undated_year_match`` is the year key
+    used when the query has no year, and ``medium_flags`` / ``doc_type_flags``
+    are bitmasks over MEDIUM_BITS / DOC_TYPE_BITS.
+
+    ``facets`` is the FacetIndex behind the year, level, subject, medium and
+    doc type filter chips.
+    """
+
+    def __init__(self, df):
+        self.file_name_col = find_file_name_column(df)
+        if self.file_name_col not in df.columns:
+            df = df.assign(**{self.file_name_col: pd.Series(dtype=object)})
+        if not all(col in df.columns for col in FEATURE_COLUMNS):
+            df = pd.concat([df, build_search_features(df, self.file_name_col)], axis=1)
+        
+        tokens = df['Tokens'].tolist()
+        years = df['Years'].tolist()
+        self._set_rows(
+            df,
+            postings=build_postings(tokens),
+            year_postings=build_postings(years),
+            year_matrix=build_year_matrix(years),
+            medium_flags=np.array([encode_flags(values, MEDIUM_BITS) for values in df['Mediums']], dtype=np.uint8),
+            doc_type_flags=np.array([encode_flags(values, DOC_TYPE_BITS) for values in df['Doc Types']], dtype=np.uint8),
+        )
+
+    def _set_rows(self, df, postings, year_postings, year_matrix, medium_flags, doc_type_flags, hashes=None):
+        self.df = df
+        # Rows as returned to callers, without the search feature columns
+        self.records = df.drop(columns=FEATURE_COLUMNS)
+        # The records' column arrays, so results are gathered without indexing the DataFrame
+        self.record_columns = {col: self.records[col].array for col in self.records.columns}
+        self.positions = np.arange(len(df), dtype=np.int64)
+        # Content hash of the indexed rows; result caches key on it
+        self.row_hashes = row_hashes(self.records) if hashes is None else hashes
+        self.version = index_version(self.records, self.row_hashes)
+        
+        self.postings = postings
+        self.year_postings = year_postings
+        self.year_matrix = year_matrix
+        self.undated_year_match = np.where(self.year_matrix[:, 0] != NO_YEAR, 100, 9999)
+        
+        # Normalized names and vocabulary for the optional typo-tolerant stage
+        self.normalized_names = df['Normalized Name'].tolist()
+        self.vocabulary = sorted(word for word in SUBJECTS | MEDIUMS | DOC_TYPES if word in self.postings)
+        
+        # Sorted subjects, levels, mediums, doc types and years for autocomplete
+        self.completions = sorted(
+            [word for word in SUBJECTS | MEDIUMS | LEVELS | DOC_TYPES if word in self.postings]
+            + list(self.year_postings))
+        
+        self.medium_flags = medium_flags
+        self.doc_type_flags = doc_type_flags
+        
+        self.facets = FacetIndex(postings, year_postings, len(df))
+
+    def updated(self, records):
+        """Return a SearchIndex over ``records`` (a freshly read master index).
+
+        Rows already in this index keep their search features and derived
+        structures; only added rows go through feature extraction, and removed
+        rows are dropped from the posting lists. The result is the same as
+        ``SearchIndex(records)``.
+        """
+        records = records.reset_index(drop=True)
+        if self.records.columns.tolist() != records.columns.tolist():
+            return SearchIndex(records)
+        hashes = row_hashes(records)
+        
+        # Old position of every new row, or -1 for added rows
+        old_positions = row_keys(self.row_hashes).get_indexer(row_keys(hashes))
+        kept = np.flatnonzero(old_positions >= 0)
+        added = np.flatnonzero(old_positions < 0)
+        if len(kept) == len(self) and not len(added) and np.array_equal(old_positions, self.positions):
+            return self
+        if np.any(np.diff(old_positions[kept]) < 0):
+            # Rows were reordered; reuse the features but rebuild the rest
+            features = self.df[FEATURE_COLUMNS].iloc[old_positions[kept]].set_axis(kept)
+            if len(added):
+                features = pd.concat([features, build_search_features(records.iloc[added], self.file_name_col)])
+            return SearchIndex(pd.concat([records, features.sort_index()], axis=1))
+        
+        added_features = build_search_features(records.iloc[added], self.file_name_col)
+        features = self.df[FEATURE_COLUMNS].iloc[old_positions[kept]].set_axis(kept)
+        if len(added):
+            features = pd.concat([features, added_features]).sort_index()
+        df = pd.concat([records, features], axis=1)
+        
+        # Move the kept rows to their new positions, then add the new rows
+        postings, year_postings = self.postings, self.year_postings
+        if not np.array_equal(kept, old_positions[kept]) or len(kept) < len(self):
+            remap = np.full(len(self), -1, dtype=np.int64)
+            remap[old_positions[kept]] = kept
+            first_changed = int(np.flatnonzero(remap != self.positions)[0])
+            postings = remap_postings(postings, remap, first_changed)
+            year_postings = remap_postings(year_postings, remap, first_changed)
+        added_years = added_features['Years'].tolist()
+        postings = merge_postings(postings, {
+            token: added[rows] for token, rows in build_postings(added_features['Tokens']).items()})
+        year_postings = merge_postings(year_postings, {
+            year: added[rows] for year, rows in build_postings(added_years).items()})
+        
+        added_matrix = build_year_matrix(added_years)
+        width = max(self.year_matrix.shape[1], added_matrix.shape[1])
+        year_matrix = np.full((len(df), width), NO_YEAR, dtype=np.int32)
+        year_matrix[kept, :self.year_matrix.shape[1]] = self.year_matrix[old_positions[kept]]
+        year_matrix[added, :added_matrix.shape[1]] = added_matrix
+        # Trim padding left behind by removed rows, as a fresh build would
+        year_matrix = year_matrix[:, :max(1, int((year_matrix != NO_YEAR).sum(axis=1).max(initial=0)))]
+        
+        medium_flags = np.zeros(len(df), dtype=np.uint8)
+        medium_flags[kept] = self.medium_flags[old_positions[kept]]
+        medium_flags[added] = [encode_flags(values, MEDIUM_BITS) for values in added_features['Mediums']]
+        doc_type_flags = np.zeros(len(df), dtype=np.uint8)
+        doc_type_flags[kept] = self.doc_type_flags[old_positions[kept]]
+        doc_type_flags[added] = [encode_flags(values, DOC_TYPE_BITS) for values in added_features['Doc Types']]
+        
+        index = SearchIndex.__new__(SearchIndex)
+        index.file_name_col = self.file_name_col
+        index._set_rows(df, postings, year_postings, year_matrix, medium_flags, doc_type_flags, hashes)
+        return index
+
+    def __len__(self):
+        return len(self.df)
+
+    def lookup(self, tokens):
+        """Return the sorted row positions containing any of ``tokens``."""
+        lists = [self.postings[token] for token in tokens if token in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def count_matches(self, tokens):
+        """Return, for every row, how many of ``tokens`` its filename contains."""
+        counts = np.zeros(len(self), dtype=np.int64)
+        for token in tokens:
+            if token in self.postings:
+                counts[self.postings[token]] += 1
+        return counts
+
+    def correct_words(self, words):
+        """Map misspelled words to the closest subject, medium or doc type in the index."""
+        words = [word for word in words if len(word) >= 4]
+        if not words or not self.vocabulary:
+            return {}
+        scores = process.cdist(words, self.vocabulary, scorer=fuzz.ratio,
+                               score_cutoff=TYPO_SCORE_CUTOFF, workers=-1)
+        best = scores.argmax(axis=1)
+        return {
+            word: self.vocabulary[column]
+            for word, column, row_scores in zip(words, best, scores)
+            if row_scores[column] > 0
+        }
+
+    def suggest(self, query, limit=SUGGESTION_LIMIT):
+        """Complete the last word of ``query`` from the index vocabulary.
+
+        Returns up to ``limit`` ``(completed query, count)`` pairs, most
+        matches first. Candidates come from a bisect over the sorted
+        ``completions`` list, so a keystroke costs one posting list lookup per
+        candidate. ``count`` is the number of papers containing the completed
+        word and, when the query already names a subject, passing its strict
+        subject filter. A query with no subject would end on the "no results"
+        page, so only subjects are offered until one is typed.
+        """
+        words = normalize_text(query).split()
+        if not words or query[-1:].isspace():
+            return []
+        head, prefix = words[:-1], words[-1]
+        start = bisect.bisect_left(self.completions, prefix)
+        end = bisect.bisect_right(self.completions, prefix + '\uffff', lo=start)
+        candidates = [word for word in self.completions[start:end] if word not in head]
+        
+        head_subjects = set(head) & SUBJECTS
+        if head_subjects:
+            subject_rows = np.zeros(len(self), dtype=bool)
+            subject_rows[self.lookup(head_subjects)] = True
+        
+        suggestions = []
+        for word in candidates:
+            if head_subjects:
+                rows = self.postings[word] if word in self.postings else self.year_postings[word]
+                count = int(np.count_nonzero(subject_rows[rows]))
+            elif word in SUBJECTS:
+                count = len(self.postings[word])
+            else:
+                continue
+            if count:
+                suggestions.append((' '.join(head + [word]), count))
+        suggestions.sort(key=lambda suggestion: (-suggestion[1], suggestion[0]))
+        return suggestions[:limit]
+
+    def typo_scores(self, words):
+        """Score every filename against ``words`` (0-100) with one batched cdist call."""
+        scores = process.cdist(words, self.normalized_names, scorer=fuzz.partial_ratio,
+                               dtype=np.uint8, workers=-1)
+        return scores.mean(axis=0).round().astype(np.int64)
+
+
+# Seconds between checks of master_index.csv for changes
+INDEX_CHECK_INTERVAL = 2
+
+
+class IndexStore:
+    """Holds the live SearchIndex and swaps in a new one when the CSV changes.
+
+    ``current()`` runs on every rerun; at most every ``check_interval``
+    seconds it compares the CSV's file_signature with the one the index was
+    built from. A change starts a background reload that applies only the
+    added and removed rows (SearchIndex.updated) and rewrites the snapshot,
+    while the previous index keeps serving searches until the swap.
+    """
+
+    def __init__(self, index, csv_path=MASTER_INDEX_CSV, snapshot_path=None,
+                 check_interval=INDEX_CHECK_INTERVAL):
+        self.index = index
+        self.csv_path = csv_path
+        self.snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+        self.check_interval = check_interval
+        self.source = self._signature()
+        self._checked = time.monotonic()
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        try:
+            return file_signature(self.csv_path)
+        except OSError:
+            return None
+
+    def current(self):
+        """Return the live SearchIndex, starting a reload if the CSV has changed."""
+        now = time.monotonic()
+        with self._lock:
+            if self._reloading or now - self._checked < self.check_interval:
+                return self.index
+            self._checked = now
+            if self._signature() == self.source:
+                return self.index
+            self._reloading = True
+        threading.Thread(target=self.reload, name='index-reload', daemon=True).start()
+        return self.index
+
+    def reload(self):
+        """Apply the CSV's added and removed rows to the index now."""
+        with self._lock:
+            self._reloading = True
+        source = self._signature()
+        try:
+            if source is not None and source != self.source:
+                index = self.index.updated(read_master_csv(self.csv_path))
+                self.index = index
+                save_index_snapshot(index.df, self.snapshot_path, source)
+            self.source = source
+        except Exception:
+            # Unreadable CSV (e.g. mid-write): keep serving, the next check retries it
+            logger.exception("Could not reload %s; serving the previous index", self.csv_path)
+        finally:
+            with self._lock:
+                self._reloading = False
+        return self.index
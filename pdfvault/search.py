@@ -0,0 +1,263 @@
+"""
+Ranked search over the master index and the shared search result cache
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .text import normalize_text, SUBJECTS, MEDIUMS, LEVELS, DOC_TYPES, YEAR_PATTERN
+from .index import SearchIndex, encode_flags, MEDIUM_BITS, DOC_TYPE_BITS, TYPO_SCORE_CUTOFF
+from .facets import filter_key
+
+
+# A query after typo correction, as passed to rank_rows
+ParsedQuery = namedtuple('ParsedQuery', [
+    'words', 'year', 'typo_words', 'subjects', 'mediums', 'levels', 'doc_types',
+])
+
+
+def parse_query(query, index, typo_tolerance=False):
+    """Split ``query`` into the word sets fuzzy_search ranks on.
+
+    With ``typo_tolerance``, words that appear in no filename of ``index``
+    are corrected to its closest subject/medium/doc type; words still
+    unknown are kept in ``typo_words`` for filename similarity scoring.
+    """
+    query_words = set(normalize_text(query).split())
+    
+    # Extract year patterns from query
+    query_years = set(YEAR_PATTERN.findall(query))
+    query_year = int(list(query_years)[0]) if query_years else None
+    
+    # Typo tolerance for words that appear in no filename
+    typo_words = []
+    if typo_tolerance:
+        unknown_words = sorted(word for word in query_words if word not in index.postings and not word.isdigit())
+        corrections = index.correct_words(unknown_words)
+        query_words = (query_words - corrections.keys()) | set(corrections.values())
+        typo_words = [word for word in unknown_words if word not in corrections]
+    
+    # Extract query components
+    return ParsedQuery(
+        words=query_words,
+        year=query_year,
+        typo_words=typo_words,
+        subjects=query_words & SUBJECTS,
+        mediums=query_words & MEDIUMS,
+        levels=query_words & LEVELS,
+        doc_types=query_words & DOC_TYPES,
+    )
+
+
+# Candidate sets tried by rank_rows, in order; the first non-empty one is ranked
+STAGE_SUBJECT, STAGE_TYPO, STAGE_LEVEL = 0, 1, 2
+
+
+def rank_rows(index, parsed, limit, filters=None):
+    """Rank the rows of ``index`` for a ParsedQuery and return the top ``limit``.
+
+    ``filters`` (``{facet: labels}``, see FacetIndex) restricts every
+    candidate set to the rows passing them, as if the index only held those.
+
+    Returns ``(stage, positions, sort_keys, year_match, doc_type_match,
+    medium_match)``: the candidate set used (STAGE_*), then the sorted row
+    positions with their sort key (without the position tie-breaker) and the
+    per-row match values used for scoring. Ordering by (sort key, position)
+    gives the hierarchical order.
+    """
+    typo_score = index.typo_scores(parsed.typo_words) if parsed.typo_words else None
+    allowed = index.facets.rows(filters) if filter_key(filters) else None
+    
+    # STEP 1: STRICT SUBJECT FILTERING
+    # If query has a subject, ONLY keep files that CONTAIN that exact subject
+    # FALLBACK: If no subject matches found, show files matching exam level (A/L, O/L)
+    stage = STAGE_SUBJECT
+    if parsed.subjects:
+        positions = rows = index.lookup(parsed.subjects)
+        if allowed is not None:
+            positions = rows = positions[allowed[positions]]
+        if not len(positions) and typo_score is not None:
+            # No exact subject match: try filenames close to the misspelled words
+            stage = STAGE_TYPO
+            typo_rows = typo_score >= TYPO_SCORE_CUTOFF
+            positions = rows = np.flatnonzero(typo_rows if allowed is None else typo_rows & allowed)
+    elif allowed is not None:
+        positions = rows = np.flatnonzero(allowed)
+    else:
+        # Every row is a candidate; slice the feature arrays instead of copying them
+        positions, rows = index.positions, slice(None)
+    
+    if len(positions):
+        # Calculate sorting keys for hierarchical sort, for all candidates at once
+        
+        # Sort Key 1: Year Match (0 = perfect, higher = worse)
+        if parsed.year is not None:
+            # Undated rows only hold NO_YEAR padding, so they clip to 9998 and
+            # rank below every dated file
+            year_distance = np.abs(index.year_matrix[rows] - parsed.year).min(axis=1)
+            year_match = np.minimum(year_distance, 9998)
+        else:
+            # No query year: dated files get decent priority (100), undated files 9999
+            year_match = index.undated_year_match[rows]
+        
+        # Sort Key 2: Document Type Match (0 = perfect match, 1 = no match)
+        query_doc_type_flags = encode_flags(parsed.doc_types, DOC_TYPE_BITS)
+        doc_type_match = (index.doc_type_flags[rows] & query_doc_type_flags) == 0
+        doc_type_match &= query_doc_type_flags != 0
+        
+        # Sort Key 3: Medium Match (0 = perfect match, 1 = no match)
+        query_medium_flags = encode_flags(parsed.mediums, MEDIUM_BITS)
+        medium_match = (index.medium_flags[rows] & query_medium_flags) == 0
+        medium_match &= query_medium_flags != 0
+        
+        # Sort Key 4: Overall relevance (word matches, descending)
+        word_match = index.count_matches(parsed.words)[rows]
+        
+        # Sort Key 5: Typo similarity (descending), only with typo tolerance
+        typo_match = typo_score[rows] if typo_score is not None else 0
+    else:
+        # Use fallback only if no subject matches found: every file that shares
+        # the queried exam level, in index order, with the weakest sort keys
+        stage = STAGE_LEVEL
+        positions = index.lookup(parsed.levels)
+        if allowed is not None:
+            positions = positions[allowed[positions]]
+        year_match = np.full(len(positions), 9999)
+        doc_type_match = np.ones(len(positions), dtype=bool)
+        medium_match = np.ones(len(positions), dtype=bool)
+        word_match = np.zeros(len(positions), dtype=np.int64)
+        typo_match = 0
+    
+    if not len(positions) or limit <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return stage, empty, empty, empty, empty.astype(bool), empty.astype(bool)
+    
+    # STEP 2: HIERARCHICAL SORT
+    # Sort by: Year (ascending) → Doc Type (ascending) → Medium (ascending) → Word matches (descending)
+    # → Typo similarity (descending), packed into one integer key with the row
+    # position as the final tie-breaker so ties keep index order
+    word_span = len(parsed.words) + 1
+    minor_key = (doc_type_match * 2 + medium_match) * word_span + (len(parsed.words) - word_match)
+    minor_key = minor_key * 101 + (100 - typo_match)
+    sort_key = year_match.astype(np.int64) * (4 * word_span * 101) + minor_key
+    position_key = sort_key * len(index) + positions
+    
+    # Select the top results without sorting every candidate
+    if len(position_key) > limit:
+        top = np.argpartition(position_key, limit - 1)[:limit]
+        top = top[np.argsort(position_key[top])]
+    else:
+        top = np.argsort(position_key)
+    
+    return stage, positions[top], sort_key[top], year_match[top], doc_type_match[top], medium_match[top]
+
+
+def result_frame(index, positions, year_match, doc_type_match, medium_match):
+    """Return the ranked rows of ``index.records`` with their Match Score.
+
+    The frame is assembled once from the gathered column arrays, which is
+    most of the cost of a search that hits the posting lists.
+    """
+    # Calculate match percentage for display
+    # Perfect match = 100%, decreases with year diff, doc type, medium mismatch
+    match_scores = np.full(len(positions), 100.0)
+    # Year penalty: -5% per year difference
+    match_scores -= np.where(year_match < 9990, np.minimum(year_match * 5, 50), 0)
+    # Doc type penalty: -10% if mismatch
+    match_scores -= doc_type_match * 10
+    # Medium penalty: -15% if mismatch
+    match_scores -= medium_match * 15
+    
+    columns = {col: values.take(positions) for col, values in index.record_columns.items()}
+    columns['Match Score'] = np.maximum(match_scores, 10.0)  # Minimum 10%
+    return pd.DataFrame(columns, copy=False)
+
+
+def fuzzy_search(query, df, limit=50, index=None, typo_tolerance=False, filters=None):
+    """Perform intelligent hierarchical search with strict subject filtering.
+    
+    Query Pattern: {year} {exam type} {Subject} {pastpaper/marking} {medium}
+    
+    Search Strategy:
+    1. FILTER by subject (MANDATORY - if no match, return empty for "content uploading" message)
+    2. SORT by year (exact match first, then by proximity)
+    3. SORT by document type (marking/paper based on query)
+    4. SORT by medium (exact match first)
+    
+    Pass the SearchIndex built for ``df`` as ``index`` to reuse its posting
+    lists; otherwise one is built for this call.
+    
+    With ``typo_tolerance``, query words that appear in no filename are first
+    corrected to the closest subject/medium/doc type in the index. Words that
+    still match nothing are scored against every filename with rapidfuzz; that
+    score breaks ties after the word matches, and files scoring at least
+    TYPO_SCORE_CUTOFF are used when strict subject filtering finds nothing.
+    
+    ``filters`` maps facets to the selected chip labels, e.g.
+    ``{'Year': ['2021'], 'Medium': ['Sinhala', 'Tamil']}``; only papers
+    passing them are searched.
+    """
+    if df.empty or query.strip() == "":
+        return pd.DataFrame()
+    
+    if index is None:
+        index = SearchIndex(df)
+    
+    parsed = parse_query(query, index, typo_tolerance)
+    _, positions, _, year_match, doc_type_match, medium_match = rank_rows(index, parsed, limit, filters)
+    if not len(positions):
+        return pd.DataFrame()
+    return result_frame(index, positions, year_match, doc_type_match, medium_match)
+
+
+class SearchResultCache:
+    """Process-wide LRU cache of fuzzy_search results with a size bound and TTL.
+
+    Entries are keyed on the normalized query, the years as written in the
+    query, the limit, the facet filters and the SearchIndex version. Seeing a new index version
+    drops every entry built from the previous index.
+    """
+
+    def __init__(self, maxsize=512, ttl=900):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, query, index, limit=50, typo_tolerance=False, filters=None):
+        """Return fuzzy_search results for ``query``, computing them only on a miss."""
+        # Query years are read from the raw query, so they are part of the key
+        key = (normalize_text(query), tuple(YEAR_PATTERN.findall(query)), limit, typo_tolerance, filter_key(filters))
+        now = time.monotonic()
+        
+        with self._lock:
+            if index.version != self.version:
+                self._entries.clear()
+                self.version = index.version
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+        
+        results = fuzzy_search(query, index.df, limit=limit, index=index, typo_tolerance=typo_tolerance,
+                               filters=filters)
+        
+        with self._lock:
+            if index.version == self.version:
+                self._entries[key] = (now, results)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return results.copy()
@@ -0,0 +1,90 @@
+"""
+Sharded search over a process pool, for catalogues too large for one core
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .index import SearchIndex
+from .search import parse_query, rank_rows, result_frame
+
+# The shard of the master index held by this worker process
+_shard = None
+
+
+def _load_shard(df):
+    global _shard
+    _shard = SearchIndex(df.reset_index(drop=True))
+
+
+def _shard_size():
+    return len(_shard)
+
+
+def _rank_shard(parsed, limit, filters):
+    return rank_rows(_shard, parsed, limit, filters)
+
+
+class ShardedSearch:
+    """fuzzy_search split across worker processes, one shard of rows each.
+
+    The index is cut into ``shards`` contiguous row ranges, each held by its
+    own single-process pool for the life of the object. A query is parsed
+    once against the whole index (typo corrections depend on every
+    filename), then every shard ranks its rows and returns its local top
+    ``limit``. Shards report which candidate set they used (subject matches,
+    typo matches or the exam level fallback); only the shards on the best
+    set count, so the fallback still only applies when no shard has a
+    subject match. Merging on (sort key, global position) gives the same
+    results as ``fuzzy_search(query, index.df, limit, index=index)``.
+    """
+
+    def __init__(self, index, shards=None):
+        self.index = index
+        self.version = index.version
+        shards = max(1, min(shards or os.cpu_count() or 1, len(index) or 1))
+        bounds = np.linspace(0, len(index), shards + 1).astype(int)
+        self.offsets = bounds[:-1]
+        # Spawned workers only import the core, never the parent's UI or threads
+        context = multiprocessing.get_context('spawn')
+        self._pools = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_load_shard,
+                                initargs=(index.df.iloc[start:end],))
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        # Wait for every shard to be loaded before serving queries
+        for pool in self._pools:
+            pool.submit(_shard_size).result()
+
+    def __len__(self):
+        return len(self._pools)
+
+    def search(self, query, limit=50, typo_tolerance=False, filters=None):
+        """Return the fuzzy_search results for ``query`` over the whole index."""
+        if self.index.df.empty or query.strip() == "":
+            return pd.DataFrame()
+
+        parsed = parse_query(query, self.index, typo_tolerance)
+        futures = [pool.submit(_rank_shard, parsed, limit, filters) for pool in self._pools]
+        ranked = [(offset, future.result()) for offset, future in zip(self.offsets, futures)]
+        ranked = [(offset, shard) for offset, shard in ranked if len(shard[1])]
+        if not ranked:
+            return pd.DataFrame()
+
+        stage = min(shard[0] for _, shard in ranked)
+        ranked = [(offset, shard) for offset, shard in ranked if shard[0] == stage]
+        positions = np.concatenate([offset + shard[1] for offset, shard in ranked])
+        sort_keys, year_match, doc_type_match, medium_match = (
+            np.concatenate([shard[column] for _, shard in ranked]) for column in range(2, 6))
+        top = np.lexsort((positions, sort_keys))[:limit]
+        return result_frame(self.index, positions[top], year_match[top], doc_type_match[top],
+                            medium_match[top])
+
+    def close(self):
+        """Stop the worker processes."""
+        for pool in self._pools:
+            pool.shutdown()
@@ -0,0 +1,329 @@
+"""
+Telegram Bot API client, request scheduling and file downloads
+"""
+
+import heapq
+import io
+import itertools
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import FilePathCache
+
+
+# Telegram Bot API client settings
+TELEGRAM_API_BASE = "https://api.telegram.org"
+HTTP_POOL_SIZE = 16  # Concurrent connections to api.telegram.org
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5  # Seconds; doubled after each failed attempt
+MAX_RETRY_AFTER = 30  # Longest 429 retry_after (seconds) waited out before giving up
+
+# Process-wide Bot API rate limit, shared by every session
+BOT_API_RATE = 30  # Requests per second
+BOT_API_BURST = 30
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the result
+PRIORITY_PREFETCH = 1  # Background prefetches and bundles
+
+
+class RequestScheduler:
+    """Token bucket in front of the Bot API with a priority queue of waiting requests.
+    
+    Requests leave the queue in priority order (FIFO within a priority), one
+    token each, so a traffic spike is smoothed to ``rate`` requests per
+    second instead of turning into a burst of 429s. A ``retry_after`` from
+    Telegram pauses the whole bucket.
+    """
+
+    def __init__(self, rate=BOT_API_RATE, burst=BOT_API_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._queue = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _eta(self, now, position):
+        """Seconds until the ticket at queue ``position`` (0 = next) gets a token."""
+        paused = max(0.0, self._paused_until - now)
+        return paused + max(0.0, position + 1 - self._tokens) / self.rate
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, on_wait=None):
+        """Block until this request may be sent.
+        
+        ``on_wait(position, eta)`` is called with the number of requests ahead
+        and the estimated wait in seconds whenever either changes. It runs
+        without the scheduler's lock, so a slow callback only delays its own
+        request.
+        """
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            reported = None
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    position = sum(1 for queued in self._queue if queued < ticket)
+                    if position == 0 and now >= self._paused_until and self._tokens >= 1:
+                        heapq.heappop(self._queue)
+                        self._tokens -= 1
+                        self._cond.notify_all()
+                        return
+                    eta = self._eta(now, position)
+                    if on_wait is not None and (position, round(eta)) != reported:
+                        reported = (position, round(eta))
+                        self._cond.release()
+                        try:
+                            on_wait(position, eta)
+                        finally:
+                            self._cond.acquire()
+                        continue  # The queue may have moved while unlocked
+                    self._cond.wait(min(max(eta, 0.001), 1.0))
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+
+    def pause(self, seconds):
+        """Hold every request for ``seconds`` after Telegram asks us to back off."""
+        with self._cond:
+            now = self._clock()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._queue)
+
+
+def telegram_retry_after(response):
+    """Return the retry_after seconds of a Telegram 429 response, if any."""
+    try:
+        retry_after = response.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        retry_after = None
+    if retry_after is None:
+        retry_after = response.headers.get("Retry-After")
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
+
+
+class TelegramClient:
+    """Pooled keep-alive HTTP client for the Telegram Bot API, shared across threads.
+
+    Connection resets and 5xx responses are retried with exponential backoff
+    by urllib3. 429 responses are retried after Telegram's ``retry_after``
+    when it is at most ``max_retry_after`` seconds; otherwise the 429 response
+    is returned to the caller. With a ``scheduler``, every request waits for
+    its turn and a 429 that will be waited out pauses the scheduler for all
+    callers; longer waits are left to each caller's own 429, so no request
+    blocks for minutes.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES,
+                 backoff_factor=HTTP_BACKOFF_FACTOR, max_retry_after=MAX_RETRY_AFTER, scheduler=None):
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.scheduler = scheduler
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, priority=PRIORITY_INTERACTIVE, on_wait=None, **kwargs):
+        """GET ``url``, waiting out Telegram rate limits (HTTP 429).
+        
+        ``priority`` and ``on_wait`` are passed to the scheduler, if any.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.scheduler is not None:
+                self.scheduler.acquire(priority, on_wait)
+            response = self.session.get(url, **kwargs)
+            if response.status_code != 429:
+                return response
+            retry_after = telegram_retry_after(response)
+            if retry_after is None or retry_after > self.max_retry_after:
+                return response
+            if self.scheduler is not None:
+                # Hold back every other caller too
+                self.scheduler.pause(retry_after)
+            if attempt == self.max_retries:
+                return response
+            response.close()
+            if self.scheduler is None:
+                time.sleep(retry_after)
+        return response
+
+    def api_url(self, bot_token, method):
+        return f"{TELEGRAM_API_BASE}/bot{bot_token}/{method}"
+
+    def file_url(self, bot_token, file_path):
+        return f"{TELEGRAM_API_BASE}/file/bot{bot_token}/{file_path}"
+
+
+def resolve_file(file_id, bot_token, client, path_cache, use_cache=True, priority=PRIORITY_INTERACTIVE, on_wait=None):
+    """Return (file_info, error) from getFile, reusing a cached result when allowed."""
+    if use_cache:
+        file_info = path_cache.get(file_id)
+        if file_info is not None:
+            return file_info, None
+    
+    response = client.get(client.api_url(bot_token, "getFile"), priority, on_wait, params={"file_id": file_id}, timeout=10)
+    result = response.json()
+    
+    if not result.get("ok"):
+        error_description = result.get("description", "Unknown error")
+        error_code = result.get("error_code", "N/A")
+        return None, f"❌ Telegram API error ({error_code}): {error_description}"
+    
+    file_info = result["result"]
+    path_cache.put(file_id, file_info)
+    return file_info, None
+
+
+# The Bot API only serves files up to 20 MB; downloads are streamed in chunks
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def file_too_large(size, max_bytes):
+    """Error message for a file over the download cap."""
+    return f"❌ File is too large to download ({size / 1024 / 1024:.1f} MB, limit {max_bytes / 1024 / 1024:.0f} MB)."
+
+
+def stream_telegram_file(file_id, bot_token, out, client=None, path_cache=None, max_bytes=MAX_DOWNLOAD_BYTES,
+                         priority=PRIORITY_INTERACTIVE, on_wait=None):
+    """Stream a file from Telegram into the binary file object ``out``.
+    
+    The file is read in DOWNLOAD_CHUNK_SIZE chunks, so memory use does not
+    depend on the file size. Files whose getFile size is over ``max_bytes``
+    are rejected before downloading, and the stream is cut off if it runs
+    past the reported size. ``priority`` and ``on_wait`` go to the request
+    scheduler. Pass the process-wide ``client`` and ``path_cache``; without
+    them this call gets its own. Returns (bytes_written, error).
+    """
+    try:
+        # Validate inputs
+        if not bot_token:
+            return None, "❌ Telegram Bot Token not configured."
+        
+        file_id_str = str(file_id).strip()
+        if not file_id_str:
+            return None, "❌ Invalid file ID: File ID is empty."
+        
+        if client is None:
+            client = TelegramClient()
+        if path_cache is None:
+            path_cache = FilePathCache()
+        
+        for use_cache in (True, False):
+            # Get file path from Telegram (or the getFile cache)
+            file_info, error = resolve_file(file_id_str, bot_token, client, path_cache, use_cache, priority, on_wait)
+            if error:
+                return None, error
+            
+            # Fail fast on files over the cap
+            limit = max_bytes
+            file_size = file_info.get("file_size")
+            if file_size:
+                if file_size > max_bytes:
+                    return None, file_too_large(file_size, max_bytes)
+                limit = file_size
+            
+            # Stream the file content
+            download_url = client.file_url(bot_token, file_info["file_path"])
+            with client.get(download_url, priority, on_wait, timeout=30, stream=True) as file_response:
+                if file_response.status_code == 404 and use_cache:
+                    # The cached link may have expired early; resolve the file again
+                    path_cache.invalidate(file_id_str)
+                    continue
+                file_response.raise_for_status()
+                
+                written = 0
+                for chunk in file_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > limit:
+                        return None, file_too_large(written, limit)
+                    out.write(chunk)
+                return written, None
+    
+    except requests.exceptions.Timeout:
+        return None, "❌ Request timed out. Please try again."
+    except requests.exceptions.RequestException as e:
+        return None, f"❌ Network error: {str(e)}"
+    except KeyError as e:
+        return None, f"❌ Unexpected API response format: {str(e)}"
+    except Exception as e:
+        return None, f"❌ Error downloading file: {str(e)}"
+
+
+def get_telegram_file_content(file_id, bot_token, client=None, path_cache=None, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Download file content from Telegram and return bytes."""
+    buffer = io.BytesIO()
+    _, error = stream_telegram_file(file_id, bot_token, buffer, client, path_cache, max_bytes)
+    if error:
+        return None, error
+    return buffer.getvalue(), None
+
+
+def fetch_pdf(file_id, bot_token, cache, client=None, path_cache=None, priority=PRIORITY_INTERACTIVE, on_wait=None,
+              fallback_ids=()):
+    """Make sure a file is in ``cache``, streaming it from Telegram on a miss.
+    
+    The download goes straight to a part file in the cache directory. If it
+    fails, the file IDs of other copies of the paper (``fallback_ids``) are
+    tried in turn, and the file is cached under ``file_id`` either way.
+    Returns the first error message if every copy fails, or None once the
+    file is cached.
+    """
+    if cache.path(file_id) is not None:
+        return None
+    part, temp_path = cache.open_part()
+    try:
+        with part:
+            first_error = None
+            for candidate in (file_id, *fallback_ids):
+                part.seek(0)
+                part.truncate()
+                _, error = stream_telegram_file(candidate, bot_token, part, client, path_cache,
+                                                priority=priority, on_wait=on_wait)
+                if error is None:
+                    break
+                first_error = first_error or error
+        if error is not None:
+            return first_error
+        try:
+            committed = cache.commit(file_id, temp_path)
+        except OSError as e:
+            return f"❌ Could not save the downloaded file: {str(e)}"
+        if not committed:
+            return "❌ File is too large to cache."
+        return None
+    finally:
+        cache.discard(temp_path)
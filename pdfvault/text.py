@@ -0,0 +1,134 @@
+"""
+Filename sanitizing, text normalization and search feature extraction
+
+Only the standard library is imported up front; pandas is imported by the
+functions working on whole columns.
+"""
+
+import html
+import re
+
+
+def sanitize_filename(raw_name: str) -> str:
+    """Unescape HTML entities repeatedly and strip HTML/div fragments in many encoded forms."""
+    if raw_name is None:
+        return ''
+    s = str(raw_name)
+    # Unescape HTML entities multiple times to handle double-encoding
+    for _ in range(4):
+        s = html.unescape(s)
+
+    # Remove common numeric entity forms like &#60; and variations
+    s = re.sub(r'&#\s*0*6?0?;?', '', s)
+
+    # Remove encoded or literal div tags in many variants
+    s = re.sub(r'(?i)(?:&lt;|&amp;lt;|<|\\u003c)\s*/?\s*div[^>;&]*?(?:&gt;|&amp;gt;|>|;)?', '', s)
+
+    # Remove any remaining entity-encoded tags
+    s = re.sub(r'(?i)&lt;[^&]+&gt;', '', s)
+
+    # Remove any normal HTML tags
+    s = re.sub(r'<[^>]+>', '', s)
+
+    # Trim whitespace
+    return s.strip()
+
+
+# Exam level aliases (A/L, A L, Advanced Level, O/L, ...), matched in a single pass
+LEVEL_ALIAS_PATTERN = re.compile(
+    r'\b(?:(a/l|a\s*l|advanced?\s+level)|o/l|o\s*l|ordinary\s+level)\b',
+    re.IGNORECASE
+)
+
+# Separators folded to spaces by normalize_text
+SEPARATOR_TABLE = str.maketrans({char: ' ' for char in '_-.,;:()[]{}'})
+
+
+def level_alias(match):
+    """Replacement for LEVEL_ALIAS_PATTERN: group 1 is set for advanced level."""
+    return 'al' if match.group(1) else 'ol'
+
+
+def normalize_text(text):
+    """Normalize text for better matching."""
+    if not text:
+        return ""
+    text = str(text).lower()
+    # Normalize exam levels
+    text = LEVEL_ALIAS_PATTERN.sub(level_alias, text)
+    # Replace separators with spaces
+    text = text.translate(SEPARATOR_TABLE)
+    # Normalize multiple spaces
+    return ' '.join(text.split())
+
+
+def normalize_many(values):
+    """Normalize a Series of texts, matching normalize_text element by element.
+
+    Uses pandas string methods on an object-dtype Series, so matching keeps
+    Python's regex semantics rather than those of the Arrow string backend.
+    """
+    import pandas as pd
+    
+    text = pd.Series([str(value) if value else '' for value in values], index=values.index, dtype=object)
+    return (
+        text.str.lower()
+        .str.replace(LEVEL_ALIAS_PATTERN, level_alias, regex=True)
+        .str.translate(SEPARATOR_TABLE)
+        .str.split()
+        .str.join(' ')
+    )
+
+
+# Search vocabulary
+# Include common abbreviations and full names
+SUBJECTS = frozenset([
+    'physics', 'chemistry', 'chem', 'biology', 'bio', 'mathematics', 'maths', 'math',
+    'combined', 'commerce', 'history', 'geography', 'geo', 'economics', 'econ',
+    'accounting', 'accounts', 'science', 'ict', 'technology', 'buddhism', 'hinduism',
+    'islam', 'christianity', 'art', 'music', 'drama', 'dancing', 'agriculture', 'agri',
+    'business', 'botany', 'zoology', 'logic', 'statistics', 'stats', 'political',
+    'sft', 'git', 'egt', 'bst', 'est',  # Common subject codes
+    'general', 'knowledge', 'gk'  # General knowledge
+])
+MEDIUMS = frozenset(['sinhala', 'tamil', 'english'])
+LEVELS = frozenset(['al', 'ol', 'grade', 'a/l', 'o/l'])
+DOC_TYPES = frozenset(['marking', 'scheme', 'paper', 'pastpaper', 'past', 'mcq', 'essay'])
+
+YEAR_PATTERN = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+# Per-row search features added to the master index by build_search_features()
+FEATURE_COLUMNS = ['Normalized Name', 'Tokens', 'Years', 'Subjects', 'Mediums', 'Levels', 'Doc Types']
+
+
+def extract_filename_features(filename):
+    """Parse a filename into the tuple of values stored in FEATURE_COLUMNS."""
+    return parse_normalized_name(normalize_text(str(filename)))
+
+
+def parse_normalized_name(normalized):
+    """Split an already normalized filename into its search features."""
+    tokens = frozenset(normalized.split())
+    return (
+        normalized,
+        tokens,
+        frozenset(YEAR_PATTERN.findall(normalized)),
+        tokens & SUBJECTS,
+        tokens & MEDIUMS,
+        tokens & LEVELS,
+        tokens & DOC_TYPES,
+    )
+
+
+def build_search_features(df, file_name_col='File Name'):
+    """Build the search feature table for every row of the master index.
+
+    The result shares the index of ``df`` so it can be joined onto it. This is
+    the query-independent part of fuzzy_search, so it only needs to run when
+    the index itself changes.
+    """
+    import pandas as pd
+    
+    names = pd.Series([str(name) for name in df[file_name_col]], index=df.index, dtype=object)
+    features = [parse_normalized_name(normalized) for normalized in normalize_many(names)]
+    return pd.DataFrame(features, index=df.index, columns=FEATURE_COLUMNS)
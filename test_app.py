@@ -10,14 +10,82 @@ import os
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
+import asyncio
+import json
+import numpy as np
 import pandas as pd
+import pytest
 import re
-from app_fixed import (
+import requests
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+from pdfvault.text import (
     sanitize_filename,
     normalize_text,
-    fuzzy_search,
-    load_master_index
+    normalize_many,
+    build_search_features,
+    FEATURE_COLUMNS,
+    SUBJECTS
 )
+from pdfvault.index import (
+    load_master_index,
+    read_master_csv,
+    collapse_duplicates,
+    add_display_names,
+    fallback_ids,
+    file_signature,
+    write_index_snapshot,
+    read_index_snapshot,
+    SearchIndex,
+    IndexStore
+)
+from pdfvault.search import fuzzy_search, SearchResultCache
+from pdfvault.shards import ShardedSearch
+from pdfvault.facets import FACETS, COUNTS_CACHE_SIZE
+from pdfvault.cache import PdfCache, FilePathCache, hit_rate
+from pdfvault.telegram import (
+    get_telegram_file_content,
+    fetch_pdf,
+    TelegramClient,
+    RequestScheduler,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_PREFETCH,
+    telegram_retry_after
+)
+from pdfvault.downloads import Prefetcher, build_zip_bundle, sweep_bundles
+import api
+from api import SearchService, create_app
+
+
+def make_response(status_code, payload, headers=None):
+    """Build a requests.Response carrying a JSON payload."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode('utf-8')
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    return response
+
+
+class StubSession:
+    """Session double that replays canned responses and records requested URLs."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+@pytest.fixture(scope="module")
+def df(tmp_path_factory):
+    """Master index shared by the data-dependent tests."""
+    return load_master_index(snapshot_path=str(tmp_path_factory.mktemp("index") / "master_index.npz"))
 
 
 def test_sanitize_filename():
@@ -39,6 +107,14 @@ def test_sanitize_filename():
     # Test 5: None input
     assert sanitize_filename(None) == ""
     
+    # Test 6: Display and download names are built once per index load
+    names = add_display_names(pd.DataFrame({
+        "File Name": ["<b>Physics_2021-AL.pdf</b>", "Chemistry 2019 OL", "Maths.PDF"],
+        "File ID": ["id-1", "id-2", "id-3"],
+    }))
+    assert names["Display Name"].tolist() == ["Physics 2021 AL.pdf", "Chemistry 2019 OL", "Maths.PDF"]
+    assert names["Download Name"].tolist() == ["Physics_2021-AL.pdf", "Chemistry 2019 OL.pdf", "Maths.PDF"]
+    
     print("✅ sanitize_filename tests passed")
 
 
@@ -62,15 +138,40 @@ def test_normalize_text():
     # Test 5: Empty string
     assert normalize_text("") == ""
     
+    # Test 6: Level aliases in one pass
+    assert normalize_text("O/L History, Ordinary  Level") == "ol history ol"
+    assert normalize_text("a l combined_maths") == "al combined maths"
+    
+    # Test 7: Batch normalization matches the scalar version
+    samples = ["A/L Physics", "Advanced Level", "test_file-name.pdf", "O L [2019]", "", None]
+    expected = [normalize_text(sample) for sample in samples]
+    assert normalize_many(pd.Series(samples, dtype=object)).tolist() == expected
+    
     print("✅ normalize_text tests passed")
 
 
+def test_core_imports():
+    """Test importing the core without Streamlit or the heavy libraries"""
+    print("\nTesting core imports...")
+    
+    code = (
+        "import sys, pdfvault\n"
+        "assert pdfvault.normalize_text('A/L Physics_2021') == 'al physics 2021'\n"
+        "print(sorted(name for name in ('streamlit', 'pandas', 'numpy', 'requests') if name in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]", f"Unexpected imports: {output.strip()}"
+    
+    print("✅ core import tests passed")
+
+
 def test_load_master_index():
     """Test CSV loading"""
     print("\nTesting load_master_index...")
     
     try:
-        df = load_master_index()
+        with tempfile.TemporaryDirectory() as directory:
+            df = load_master_index(snapshot_path=os.path.join(directory, "master_index.npz"))
         
         # Test 1: DataFrame not empty
         assert not df.empty, "DataFrame should not be empty"
@@ -80,8 +181,8 @@ def test_load_master_index():
         assert 'File ID' in df.columns, "File ID column missing"
         
         # Test 3: Check data types
-        assert df['File Name'].dtype == object, "File Name should be string type"
-        assert df['File ID'].dtype == object, "File ID should be string type"
+        assert pd.api.types.is_string_dtype(df['File Name']), "File Name should be string type"
+        assert pd.api.types.is_string_dtype(df['File ID']), "File ID should be string type"
         
         # Test 4: No null values in critical columns
         assert df['File Name'].notna().all(), "File Name has null values"
@@ -94,6 +195,157 @@ def test_load_master_index():
         return None
 
 
+def test_index_snapshot():
+    """Test the binary index snapshot"""
+    print("\nTesting index snapshot...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "index.csv")
+        snapshot_path = os.path.join(directory, "index.npz")
+        pd.DataFrame({
+            "File Name": ["Physics 2021 AL.pdf", "ICT Marking Scheme 2019 (1).pdf", None],
+            "File ID": ["id-1", "id-2", "id-3"],
+            "Pages": [4, 12, 7],
+        }).to_csv(csv_path, index=False)
+        df = read_master_csv(csv_path)
+        df = pd.concat([df, build_search_features(df)], axis=1)
+        source = file_signature(csv_path)
+        write_index_snapshot(df, snapshot_path, source)
+        with open(snapshot_path, "rb") as f:
+            snapshot = f.read()
+        
+        # Test 1: Round trip keeps records, dtypes and features
+        loaded = read_index_snapshot(snapshot_path, source)
+        assert loaded.equals(df), "Snapshot should round-trip the index"
+        assert list(loaded.dtypes) == list(df.dtypes)
+        assert loaded['Subjects'][0] == frozenset({'physics'})
+        os.remove(snapshot_path)
+        assert load_master_index(csv_path).equals(df) and os.path.exists(snapshot_path), \
+            "The default snapshot should sit next to the CSV"
+        print("  ✓ Snapshot round-trips records and features")
+        
+        # Test 2: Stale or unreadable snapshots fall back to the CSV
+        assert read_index_snapshot(snapshot_path, (source[0] + 1, source[1])) is None
+        assert read_index_snapshot(os.path.join(directory, "missing.npz"), source) is None
+        with open(snapshot_path, "wb") as f:
+            f.write(b"not a snapshot")
+        assert read_index_snapshot(snapshot_path, source) is None
+        
+        # Test 3: Truncated snapshots fall back to the CSV too
+        for size in (len(snapshot) // 2, len(snapshot) - 10, 100):
+            with open(snapshot_path, "wb") as f:
+                f.write(snapshot[:size])
+            assert read_index_snapshot(snapshot_path, source) is None
+        assert len(load_master_index(csv_path, snapshot_path)) == len(df)
+        print("  ✓ Stale snapshots are ignored")
+    
+    print("✅ Index snapshot tests passed")
+
+
+def test_collapse_duplicates():
+    """Test collapsing re-uploaded copies of a paper"""
+    print("\nTesting duplicate collapsing...")
+    
+    df = collapse_duplicates(pd.DataFrame({
+        "File Name": ["physics-2021-abc (1).pdf", "physics-2021-abc.pdf", "Physics-2021-ABC (2).pdf",
+                      "chemistry-2019.pdf", "chem-2019-renamed.pdf", "ict-2020.pdf"],
+        "File ID": ["id-1", "id-2", "id-3", "id-4", "id-5", "id-6"],
+        "Document ID": [None, None, None, "doc-4", "doc-4", None],
+    }))
+    
+    # Test 1: Copies collapse onto the original, which keeps its place
+    assert df['File ID'].tolist() == ["id-2", "id-4", "id-6"]
+    assert fallback_ids(df.iloc[0]) == ("id-1", "id-3")
+    print("  ✓ Copies are collapsed by canonical name")
+    
+    # Test 2: Rows sharing a Document ID are one paper whatever their names
+    assert fallback_ids(df.iloc[1]) == ("id-5",)
+    assert fallback_ids(df.iloc[2]) == ()
+    print("  ✓ Copies are collapsed by Document ID")
+    
+    # Test 3: Years in parentheses are titles, not copy suffixes
+    df = collapse_duplicates(pd.DataFrame({
+        "File Name": ["AL Physics Past Paper (2019).pdf", "AL Physics Past Paper (2020).pdf",
+                      "AL Physics Past Paper (2021).pdf", "AL Chemistry (1).pdf", "AL Chemistry (2).pdf",
+                      "AL Chemistry (2).pdf"],
+        "File ID": ["id-1", "id-2", "id-3", "id-4", "id-5", "id-6"],
+    }))
+    assert df['File ID'].tolist() == ["id-1", "id-2", "id-3", "id-4", "id-5"]
+    assert all(fallback_ids(row) == () for _, row in df.iloc[:4].iterrows())
+    assert fallback_ids(df.iloc[4]) == ("id-6",), "Only identical names merge without an original"
+    print("  ✓ Numbered titles are kept apart")
+    
+    # Test 4: 64-bit Document IDs survive rows without one
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "index.csv")
+        pd.DataFrame({
+            "File Name": ["physics-2021.pdf", "chemistry-2019.pdf", "ict-2020.pdf"],
+            "File ID": ["id-1", "id-2", "id-3"],
+            "Document ID": ["5764607523034234881", "5764607523034234882", None],
+        }).to_csv(csv_path, index=False)
+        df = read_master_csv(csv_path)
+    assert df['Document ID'].tolist()[:2] == ["5764607523034234881", "5764607523034234882"]
+    assert len(df) == 3
+    print("  ✓ Document IDs are read as text")
+    
+    print("✅ Duplicate collapsing tests passed")
+
+
+def test_index_reload():
+    """Test applying master index changes incrementally"""
+    print("\nTesting index reload...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "index.csv")
+        snapshot_path = os.path.join(directory, "index.npz")
+        rows = pd.DataFrame({
+            "File Name": ["Physics 2021 AL.pdf", "Chemistry 2019 OL.pdf", "ICT 2020 Marking Scheme.pdf"],
+            "File ID": ["id-1", "id-2", "id-3"],
+        })
+        rows.to_csv(csv_path, index=False)
+        index = SearchIndex(read_master_csv(csv_path))
+        
+        # Test 1: Added and removed rows give the same index as a fresh build
+        changed = pd.concat([rows.iloc[[0, 2]], pd.DataFrame({
+            "File Name": ["Physics 2005 Tamil Medium Past Paper.pdf"], "File ID": ["id-4"],
+        })], ignore_index=True)
+        updated = index.updated(add_display_names(collapse_duplicates(changed)))
+        fresh = SearchIndex(add_display_names(collapse_duplicates(changed)))
+        assert updated.df.equals(fresh.df) and updated.version == fresh.version
+        assert updated.postings.keys() == fresh.postings.keys()
+        assert all(np.array_equal(updated.postings[token], fresh.postings[token]) for token in fresh.postings)
+        assert np.array_equal(updated.year_matrix, fresh.year_matrix)
+        assert np.array_equal(updated.medium_flags, fresh.medium_flags)
+        assert index.updated(read_master_csv(csv_path)) is index, "Unchanged rows should keep the index"
+        print("  ✓ Incremental updates match a full rebuild")
+        
+        # Test 2: The store picks up CSV changes in the background
+        store = IndexStore(index, csv_path, snapshot_path, check_interval=0)
+        assert store.current() is index
+        changed.to_csv(csv_path, index=False)
+        assert store.current() is index, "The old index should serve while reloading"
+        deadline = time.monotonic() + 10
+        while store.source != file_signature(csv_path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.index.version == fresh.version
+        assert fuzzy_search("physics 2005", store.index.df, index=store.index)['File ID'][0] == "id-4"
+        assert read_index_snapshot(snapshot_path, file_signature(csv_path)) is not None
+        print("  ✓ CSV changes are reloaded without a restart")
+        
+        # Test 3: A CSV that fails to load is retried instead of being skipped
+        served = store.index
+        with open(csv_path, "w") as csv_file:
+            csv_file.write('File Name,File ID\n"Physics 2021 AL.pdf,id-1\n')  # Cut off mid-write
+        assert store.reload() is served, "A failed reload should keep the previous index"
+        assert store.source != file_signature(csv_path)
+        rows.to_csv(csv_path, index=False)
+        assert store.reload().version == index.version
+        assert store.source == file_signature(csv_path)
+        print("  ✓ Failed reloads are retried")
+    
+    print("✅ Index reload tests passed")
+
+
 def test_fuzzy_search(df):
     """Test fuzzy search functionality"""
     print("\nTesting fuzzy_search...")
@@ -117,8 +369,8 @@ def test_fuzzy_search(df):
     assert results.empty, "Empty query should return no results"
     print(f"  ✓ Empty query handled correctly")
     
-    # Test 4: Non-matching query
-    results = fuzzy_search("xyznonexistent123", df, limit=5)
+    # Test 4: Non-matching query (subject that is not in the index)
+    results = fuzzy_search("drama xyznonexistent123", df, limit=5)
     assert results.empty or len(results) == 0, "Non-matching query should return no results"
     print(f"  ✓ Non-matching query handled correctly")
     
@@ -132,6 +384,328 @@ def test_fuzzy_search(df):
     print("✅ fuzzy_search tests passed")
 
 
+def test_search_features(df):
+    """Test the precomputed search feature table"""
+    print("\nTesting search features...")
+    
+    sample = pd.DataFrame({
+        'File Name': ['2019 A/L Physics Sinhala Medium Marking Scheme.pdf'],
+        'File ID': ['abc']
+    })
+    features = build_search_features(sample).iloc[0]
+    
+    # Test 1: Parsed components
+    assert features['Normalized Name'] == "2019 al physics sinhala medium marking scheme pdf"
+    assert features['Years'] == {'2019'}
+    assert features['Subjects'] == {'physics'}
+    assert features['Mediums'] == {'sinhala'}
+    assert features['Levels'] == {'al'}
+    assert features['Doc Types'] == {'marking', 'scheme'}
+    print("  ✓ Filename components parsed correctly")
+    
+    if df is None or df.empty:
+        print("⚠️ Skipping index feature tests - no data available")
+        return
+    
+    # Test 2: Index carries the feature table
+    assert all(col in df.columns for col in FEATURE_COLUMNS), "Feature columns missing"
+    
+    # Test 3: Precomputed and on-the-fly features rank identically
+    raw = df[['File Name', 'File ID']]
+    for query in ["physics 2021", "chemistry al sinhala marking", "drama al", "mathematics"]:
+        expected = fuzzy_search(query, raw, limit=20)
+        actual = fuzzy_search(query, df, limit=20)
+        assert expected['File ID'].tolist() == actual['File ID'].tolist(), f"Ranking differs for '{query}'"
+    print("  ✓ Precomputed features match on-the-fly ranking")
+    
+    print("✅ search feature tests passed")
+
+
+def test_search_index(df):
+    """Test the inverted token index"""
+    print("\nTesting search index...")
+    
+    if df is None or df.empty:
+        print("⚠️ Skipping search index tests - no data available")
+        return
+    
+    index = SearchIndex(df)
+    
+    # Test 1: Posting lists agree with a full scan
+    for token in ['physics', 'al', 'sinhala', 'marking']:
+        expected = [i for i, tokens in enumerate(df['Tokens']) if token in tokens]
+        assert index.lookup({token}).tolist() == expected, f"Postings wrong for '{token}'"
+    print("  ✓ Posting lists match full scan")
+    
+    # Test 2: Unions are sorted and de-duplicated
+    union = index.lookup({'physics', 'chemistry'}).tolist()
+    assert union == sorted(set(union)), "Posting union should be sorted and unique"
+    assert index.lookup({'xyznonexistent123'}).size == 0
+    
+    # Test 3: Searching through a prebuilt index gives the same ranking
+    for query in ["physics 2021", "drama al", "ict ol", "chemistry sinhala"]:
+        expected = fuzzy_search(query, df, limit=20)
+        actual = fuzzy_search(query, df, limit=20, index=index)
+        assert expected['File ID'].tolist() == actual['File ID'].tolist(), f"Ranking differs for '{query}'"
+    print("  ✓ Indexed search matches unindexed search")
+    
+    # Test 4: A missing master index gives an empty index instead of an error
+    empty = SearchIndex(pd.DataFrame())
+    assert empty.df.empty and fuzzy_search("physics", empty.df, index=empty).empty
+    print("  ✓ Empty master index is searchable")
+    
+    print("✅ search index tests passed")
+
+
+def test_ranking_order():
+    """Test hierarchical ordering and match scores on a known sample"""
+    print("\nTesting ranking order...")
+    
+    sample = pd.DataFrame({
+        'File Name': [
+            '2019 AL Physics Sinhala Medium Marking Scheme.pdf',
+            '2021 AL Physics English Medium Past Paper.pdf',
+            'AL Physics Tamil Medium.pdf',
+            '2020 AL Physics Sinhala Medium Past Paper.pdf',
+            '2019 AL Chemistry Sinhala Medium Past Paper.pdf',
+        ],
+        'File ID': ['p2019', 'p2021', 'pundated', 'p2020', 'c2019']
+    })
+    
+    # Test 1: Year → doc type → medium ordering within the subject
+    results = fuzzy_search("physics 2019 sinhala paper", sample, limit=10)
+    assert results['File ID'].tolist() == ['p2019', 'p2020', 'p2021', 'pundated']
+    assert results['Match Score'].tolist() == [90.0, 95.0, 75.0, 75.0]
+    print("  ✓ Hierarchical order and scores are correct")
+    
+    # Test 2: Limit keeps the best results in order
+    results = fuzzy_search("physics 2019 sinhala paper", sample, limit=2)
+    assert results['File ID'].tolist() == ['p2019', 'p2020']
+    
+    # Test 3: Level fallback keeps index order
+    results = fuzzy_search("drama al", sample, limit=10)
+    assert results['File ID'].tolist() == sample['File ID'].tolist()
+    assert set(results['Match Score']) == {75.0}
+    print("  ✓ Level fallback keeps index order")
+    
+    print("✅ ranking order tests passed")
+
+
+def test_typo_tolerance():
+    """Test typo-tolerant search"""
+    print("\nTesting typo tolerance...")
+    
+    sample = pd.DataFrame({
+        'File Name': [
+            '2021 AL Chemistry Sinhala Medium.pdf',
+            '2021 AL Physics English Medium.pdf',
+            '2021 AL Biology Ananda College.pdf',
+            '2021 AL Biology Royal College.pdf',
+        ],
+        'File ID': ['chem', 'phys', 'bio-ananda', 'bio-royal']
+    })
+    
+    # Test 1: Misspelled subjects are corrected before strict filtering
+    results = fuzzy_search("physcis 2021", sample, limit=5, typo_tolerance=True)
+    assert results['File ID'].tolist() == ['phys']
+    results = fuzzy_search("chemestry", sample, limit=5, typo_tolerance=True)
+    assert results['File ID'].tolist() == ['chem']
+    print("  ✓ Misspelled subjects are corrected")
+    
+    # Test 2: Other misspelled words break ties by filename similarity
+    results = fuzzy_search("biology royl colege", sample, limit=5, typo_tolerance=True)
+    assert results['File ID'].tolist() == ['bio-royal', 'bio-ananda']
+    print("  ✓ Filename similarity breaks ties")
+    
+    # Test 3: Disabled by default
+    results = fuzzy_search("chemestry", sample, limit=5)
+    assert len(results) == len(sample)
+    
+    print("✅ typo tolerance tests passed")
+
+
+def test_suggestions():
+    """Test query autocomplete"""
+    print("\nTesting suggestions...")
+    
+    index = SearchIndex(pd.DataFrame({
+        'File Name': [
+            '2019 AL Combined Maths Sinhala Medium.pdf',
+            '2019 AL Combined Maths Tamil Medium.pdf',
+            '2020 AL Combined Maths Marking Scheme.pdf',
+            '2019 AL Chemistry Sinhala Medium.pdf',
+        ],
+        'File ID': ['cm-si', 'cm-ta', 'cm-ms', 'chem']
+    }))
+    
+    # Test 1: Subjects are completed with their paper counts
+    assert index.suggest("c") == [("combined", 3), ("chemistry", 1)]
+    print("  ✓ Subjects are completed")
+    
+    # Test 2: After a subject, completions are counted within its strict filter
+    assert index.suggest("combined maths 20") == [("combined maths 2019", 2), ("combined maths 2020", 1)]
+    assert index.suggest("Combined Maths 2019 s") == [("combined maths 2019 scheme", 1), ("combined maths 2019 sinhala", 1)]
+    print("  ✓ Completions are counted within the subject filter")
+    
+    # Test 3: Nothing is offered for queries without a subject or a word to complete
+    assert index.suggest("2019 sin") == []
+    assert index.suggest("combined ") == []
+    assert index.suggest("") == []
+    
+    print("✅ suggestion tests passed")
+
+
+def test_facets():
+    """Test filter chips and their counts"""
+    print("\nTesting facets...")
+    
+    index = SearchIndex(pd.DataFrame({
+        'File Name': [
+            '2019 AL Physics Sinhala Medium.pdf',
+            '2020 AL Physics Tamil Medium Marking Scheme.pdf',
+            '2019 AL Chem Tamil Medium Past Paper.pdf',
+            '2021 OL Chemistry English Medium Model Paper.pdf',
+        ],
+        'File ID': ['p19', 'p20', 'c19', 'c21']
+    }))
+    facets = index.facets
+    
+    # Test 1: One chip per value in the index, with subject spellings grouped
+    counts = facets.counts()
+    assert counts['Year'] == {'2021': 1, '2020': 1, '2019': 2}
+    assert counts['Subject'] == {'Physics': 2, 'Chemistry': 2}
+    assert counts['Doc Type'] == {'Past Paper': 1, 'Model Paper': 1, 'Marking Scheme': 1}
+    assert set().union(*FACETS['Subject'].values()) == SUBJECTS
+    print("  ✓ Facet values are counted")
+    
+    # Test 2: Chips in one facet are ORed, facets are ANDed
+    assert facets.count({'Year': ['2019', '2020'], 'Medium': ['Tamil']}) == 2
+    assert facets.count({'Level': ['O/L'], 'Medium': ['Tamil']}) == 0
+    assert facets.count({'Year': ['1990']}) == 0
+    assert facets.count({'Year': []}) == 4
+    assert facets.rows({'Doc Type': ['Past Paper']}).tolist() == [False, False, True, False]
+    print("  ✓ Filters combine as expected")
+    
+    # Test 3: A facet's counts ignore its own selection but follow the others
+    counts = facets.counts({'Medium': ['Tamil']})
+    assert counts['Medium'] == {'Sinhala': 1, 'Tamil': 2, 'English': 1}
+    assert counts['Subject'] == {'Physics': 1, 'Chemistry': 1}
+    print("  ✓ Counts follow the other facets' filters")
+    
+    # Test 4: Search only ranks papers passing the filters, and caches them apart
+    results = fuzzy_search("physics 2019", index.df, index=index, filters={'Medium': ['Tamil']})
+    assert list(results['File ID']) == ['p20']
+    assert fuzzy_search("physics", index.df, index=index, filters={'Level': ['O/L']}).empty
+    cache = SearchResultCache()
+    assert len(cache.search("chem chemistry", index, filters={'Year': ['2021']})) == 1
+    assert len(cache.search("chem chemistry", index)) == 2
+    print("  ✓ Filtered search")
+    
+    # Test 5: Sessions share the memoized counts while it evicts
+    selections = [{'Year': [str(year)]} for year in range(1800, 1800 + COUNTS_CACHE_SIZE * 2)]
+    errors = []
+    
+    def count_all():
+        try:
+            for filters in selections:
+                assert facets.counts(filters)['Subject'] == {'Physics': 0, 'Chemistry': 0}
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=count_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+    assert len(facets._counts) <= COUNTS_CACHE_SIZE
+    print("  ✓ Counts are safe to share between threads")
+    
+    print("✅ facet tests passed")
+
+
+def test_sharded_search():
+    """Test search split across worker processes"""
+    print("\nTesting sharded search...")
+    
+    index = SearchIndex(pd.DataFrame({
+        'File Name': [
+            '2019 AL Physics Sinhala Medium.pdf',
+            '2020 AL Physics Marking Scheme.pdf',
+            '2019 AL Chemistry Tamil Medium.pdf',
+            '2021 OL Science.pdf',
+            '2019 AL Pyhsics Paper.pdf',
+        ],
+        'File ID': ['p19', 'p20', 'c19', 's21', 'typo']
+    }))
+    sharded = ShardedSearch(index, shards=2)
+    try:
+        # Test 1: Shards merge to the single-process ranking, including the level fallback
+        for query in ["physics 2019", "physics", "al 2019 paper", "2021 ol", "pyhsics"]:
+            expected = fuzzy_search(query, index.df, limit=3, index=index, typo_tolerance=True)
+            actual = sharded.search(query, limit=3, typo_tolerance=True)
+            assert list(actual['File ID']) == list(expected['File ID']), query
+            assert list(actual['Match Score']) == list(expected['Match Score']), query
+        print("  ✓ Sharded results match fuzzy_search")
+        
+        # Test 2: Filters apply on every shard
+        filters = {'Year': ['2019']}
+        expected = fuzzy_search("physics", index.df, index=index, filters=filters)
+        assert list(sharded.search("physics", filters=filters)['File ID']) == list(expected['File ID'])
+        
+        # Test 3: Empty queries return nothing
+        assert sharded.search("  ").empty
+    finally:
+        sharded.close()
+    
+    print("✅ sharded search tests passed")
+
+
+def test_search_result_cache():
+    """Test the shared search result cache"""
+    print("\nTesting search result cache...")
+    
+    sample = pd.DataFrame({
+        'File Name': ['2019 AL Physics.pdf', '2020 AL Chemistry.pdf', '2021 OL History.pdf'],
+        'File ID': ['a', 'b', 'c']
+    })
+    index = SearchIndex(sample)
+    cache = SearchResultCache(maxsize=2, ttl=60)
+    
+    # Test 1: Equivalent queries share one entry
+    first = cache.search("Physics 2019", index, limit=5)
+    second = cache.search("physics   2019", index, limit=5)
+    assert first.equals(second)
+    assert (cache.hits, cache.misses) == (1, 1)
+    print("  ✓ Repeated queries are served from the cache")
+    
+    # Test 2: Cached results cannot be modified by callers
+    second['Match Score'] = 0
+    assert cache.search("physics 2019", index, limit=5)['Match Score'].tolist() == first['Match Score'].tolist()
+    
+    # Test 3: LRU eviction keeps the cache bounded
+    cache.search("chemistry", index, limit=5)
+    cache.search("history", index, limit=5)
+    assert len(cache) == 2
+    cache.search("physics 2019", index, limit=5)
+    assert cache.misses == 4, "Least recently used entry should have been evicted"
+    
+    # Test 4: A new index version invalidates every entry
+    updated = SearchIndex(pd.concat([sample, pd.DataFrame({'File Name': ['2019 AL Physics Tamil.pdf'], 'File ID': ['d']})]))
+    assert updated.version != index.version
+    assert len(cache.search("physics 2019", updated, limit=5)) == 2
+    assert len(cache) == 1
+    print("  ✓ Eviction and index versioning work")
+    
+    # Test 5: Expired entries are recomputed
+    expired = SearchResultCache(ttl=0)
+    expired.search("physics", index)
+    expired.search("physics", index)
+    assert expired.hits == 0
+    
+    print("✅ search result cache tests passed")
+
+
 def test_csv_data_quality(df):
     """Test the quality of CSV data"""
     print("\nTesting CSV data quality...")
@@ -171,13 +745,314 @@ def test_csv_data_quality(df):
     print("✅ CSV data quality tests completed")
 
 
+def test_pdf_cache():
+    """Test the shared on-disk PDF cache"""
+    print("\nTesting PDF cache...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PdfCache(directory, max_bytes=10)
+        
+        # Test 1: Round trip
+        assert cache.read("a") is None
+        cache.put("a", b"aaaa")
+        assert cache.read("a") == b"aaaa"
+        assert "a" in cache and cache.total_bytes == 4
+        print("  ✓ Stored files can be read back")
+        
+        # Test 2: Least recently used files are evicted to fit the budget
+        cache.put("b", b"bbbb")
+        cache.read("a")
+        cache.put("c", b"cccc")
+        assert "b" not in cache, "Least recently used file should be evicted"
+        assert cache.read("a") == b"aaaa" and cache.read("c") == b"cccc"
+        assert cache.total_bytes <= 10
+        
+        # Test 3: Files larger than the budget are not cached
+        cache.put("huge", b"x" * 11)
+        assert "huge" not in cache
+        print("  ✓ Byte budget is enforced with LRU eviction")
+        
+        # Test 4: Writes are atomic and survive a restart
+        assert not [name for name in os.listdir(directory) if name.endswith('.part')]
+        reopened = PdfCache(directory, max_bytes=10)
+        assert reopened.read("c") == b"cccc"
+        
+        # Test 5: Cached files are served without contacting Telegram
+        assert fetch_pdf("c", "", reopened) is None
+        print("  ✓ Cache persists and serves downloads")
+        
+        # Test 6: Another process's download in progress survives a restart
+        part, live_path = reopened.open_part()
+        part.close()
+        part, stale_path = reopened.open_part()
+        part.close()
+        os.utime(stale_path, (0, 0))
+        PdfCache(directory, max_bytes=10)
+        assert os.path.exists(live_path) and not os.path.exists(stale_path)
+        print("  ✓ Only stale part files are swept")
+    
+    print("✅ PDF cache tests passed")
+
+
+def test_telegram_client():
+    """Test the pooled Telegram client"""
+    print("\nTesting Telegram client...")
+    
+    rate_limited = {"ok": False, "error_code": 429, "parameters": {"retry_after": 0}}
+    
+    # Test 1: retry_after is read from the body, then the header
+    assert telegram_retry_after(make_response(429, rate_limited)) == 0
+    assert telegram_retry_after(make_response(429, {"ok": False}, {"Retry-After": "3"})) == 3
+    assert telegram_retry_after(make_response(429, {"ok": False})) is None
+    
+    # Test 2: 429 responses are retried after retry_after
+    client = TelegramClient(max_retries=2)
+    client.session = StubSession([make_response(429, rate_limited), make_response(200, {"ok": True})])
+    assert client.get("https://example.invalid").status_code == 200
+    assert len(client.session.urls) == 2
+    print("  ✓ Rate-limited requests are retried")
+    
+    # Test 3: Long waits are reported instead of slept
+    client = TelegramClient(max_retry_after=1)
+    slow = {"ok": False, "error_code": 429, "parameters": {"retry_after": 60}}
+    client.session = StubSession([make_response(429, slow)])
+    assert client.get("https://example.invalid").status_code == 429
+    
+    # Test 4: Downloads go through the shared client
+    client = TelegramClient()
+    client.session = StubSession([
+        make_response(200, {"ok": True, "result": {"file_path": "documents/file_1.pdf"}}),
+        make_response(200, {"pdf": True}),
+    ])
+    content, error = get_telegram_file_content("file-id", "token", client=client, path_cache=FilePathCache())
+    assert error is None and content == b'{"pdf": true}'
+    assert client.session.urls[1].endswith("/file/bottoken/documents/file_1.pdf")
+    print("  ✓ Downloads use the pooled client")
+    
+    print("✅ Telegram client tests passed")
+
+
+def test_request_scheduler():
+    """Test the shared Bot API scheduler"""
+    print("\nTesting request scheduler...")
+    
+    # Test 1: Interactive requests jump ahead of queued prefetches
+    scheduler = RequestScheduler(rate=20, burst=1)
+    scheduler.acquire()
+    order = []
+    feedback = []
+    
+    def request(name, priority):
+        scheduler.acquire(priority, on_wait=lambda position, eta: feedback.append((name, position, eta)))
+        order.append(name)
+    
+    threads = []
+    for name, priority in (("prefetch", PRIORITY_PREFETCH), ("click", PRIORITY_INTERACTIVE)):
+        thread = threading.Thread(target=request, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        while len(scheduler) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["click", "prefetch"], f"Unexpected order {order}"
+    assert ("click", 0) in [(name, position) for name, position, _ in feedback]
+    assert all(eta >= 0 for _, _, eta in feedback)
+    print("  ✓ Interactive requests go first")
+    
+    # Test 2: retry_after pauses every caller, with an ETA
+    scheduler = RequestScheduler()
+    scheduler.pause(0.2)
+    feedback = []
+    start = time.perf_counter()
+    scheduler.acquire(on_wait=lambda position, eta: feedback.append(eta))
+    assert time.perf_counter() - start >= 0.15
+    assert feedback and feedback[0] > 0.1
+    
+    # A slow on_wait does not hold up other callers
+    scheduler = RequestScheduler(rate=20, burst=1)
+    scheduler.acquire()
+    other = threading.Thread(target=scheduler.pause, args=(0,))
+    
+    def slow_feedback(position, eta):
+        if not other.is_alive() and other.ident is None:
+            other.start()
+            other.join(1)
+            feedback.append(other.is_alive())
+    
+    feedback = []
+    scheduler.acquire(on_wait=slow_feedback)
+    assert feedback == [False], "Another caller should get the lock while on_wait runs"
+    
+    # Test 3: A 429 through the client pauses the scheduler and retries
+    client = TelegramClient(scheduler=RequestScheduler())
+    client.session = StubSession([
+        make_response(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.1}}),
+        make_response(200, {"ok": True}),
+    ])
+    start = time.perf_counter()
+    assert client.get("https://example.invalid").status_code == 200
+    assert time.perf_counter() - start >= 0.05
+    
+    # Test 4: Waits too long to sleep through do not block other callers
+    client = TelegramClient(max_retry_after=1, scheduler=RequestScheduler())
+    client.session = StubSession([make_response(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 3600}})])
+    assert client.get("https://example.invalid").status_code == 429
+    start = time.perf_counter()
+    client.scheduler.acquire()
+    assert time.perf_counter() - start < 0.5
+    print("  ✓ retry_after pauses the queue")
+    
+    print("✅ Request scheduler tests passed")
+
+
+def test_file_path_cache():
+    """Test the getFile result cache"""
+    print("\nTesting getFile cache...")
+    
+    resolved = {"ok": True, "result": {"file_path": "documents/file_1.pdf", "file_size": 10}}
+    
+    # Test 1: Repeat downloads skip getFile
+    path_cache = FilePathCache()
+    client = TelegramClient()
+    client.session = StubSession([
+        make_response(200, resolved), make_response(200, {"pdf": 1}), make_response(200, {"pdf": 1}),
+    ])
+    get_telegram_file_content("file-id", "token", client=client, path_cache=path_cache)
+    get_telegram_file_content("file-id", "token", client=client, path_cache=path_cache)
+    assert sum("/getFile" in url for url in client.session.urls) == 1
+    assert (path_cache.hits, hit_rate(path_cache)) == (1, "50.0%")
+    print("  ✓ Cached file paths skip getFile")
+    
+    # Test 2: A 404 on a cached path resolves the file again
+    client.session = StubSession([
+        make_response(404, {"ok": False}), make_response(200, resolved), make_response(200, {"pdf": 2}),
+    ])
+    content, error = get_telegram_file_content("file-id", "token", client=client, path_cache=path_cache)
+    assert error is None and content == b'{"pdf": 2}'
+    assert "/getFile" in client.session.urls[1]
+    print("  ✓ Expired links are re-resolved")
+    
+    # Test 3: Entries expire after the TTL
+    expired = FilePathCache(ttl=0)
+    expired.put("file-id", resolved["result"])
+    assert expired.get("file-id") is None and len(expired) == 0
+    
+    print("✅ getFile cache tests passed")
+
+
+class BlockingSession(StubSession):
+    """StubSession that holds every request until ``release`` is set."""
+
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.release = threading.Event()
+
+    def get(self, url, **kwargs):
+        self.release.wait(5)
+        return super().get(url, **kwargs)
+
+
+def test_prefetcher():
+    """Test background prefetching into the PDF cache"""
+    print("\nTesting prefetcher...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        client = TelegramClient()
+        client.session = BlockingSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/file.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 1}),
+        ])
+        prefetcher = Prefetcher(PdfCache(directory), client=client, path_cache=FilePathCache())
+        
+        # Test 1: Repeated prefetches and clicks share one download
+        prefetcher.prefetch(["file", "file"], "token")
+        prefetcher.prefetch(["file"], "token")
+        assert prefetcher.pending("file")
+        client.session.release.set()
+        assert prefetcher.fetch("file", "token") is None
+        assert len(client.session.urls) == 2, "Only one getFile and one download expected"
+        assert prefetcher.cache.read("file") == b'{"pdf": 1}'
+        print("  ✓ In-flight downloads are deduplicated")
+        
+        # Test 2: Cached files are not fetched again
+        prefetcher.prefetch(["file"], "token")
+        assert not prefetcher.pending("file")
+        assert prefetcher.fetch("file", "token") is None
+        assert len(client.session.urls) == 2
+        print("  ✓ Cached files are skipped")
+        
+        # Test 3: A click on a file queued behind other prefetches runs at once
+        prefetcher = Prefetcher(PdfCache(directory), max_workers=1, client=client, path_cache=FilePathCache())
+        worker_free = threading.Event()
+        prefetcher._executor.submit(worker_free.wait, 5)
+        client.session = StubSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/queued.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 2}),
+        ])
+        queued = prefetcher.submit("queued", "token")
+        assert prefetcher.fetch("queued", "token") is None
+        assert not worker_free.is_set() and queued.result(0) is None
+        worker_free.set()
+        prefetcher._executor.shutdown(wait=True)
+        assert len(client.session.urls) == 2, "The queued prefetch should not download again"
+        print("  ✓ Clicks take over queued prefetches")
+    
+    print("✅ Prefetcher tests passed")
+
+
+def test_zip_bundle():
+    """Test bundling results into a ZIP"""
+    print("\nTesting ZIP bundles...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        client = TelegramClient()
+        client.session = StubSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/new.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 2}),
+            make_response(200, {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}),
+        ])
+        prefetcher = Prefetcher(PdfCache(directory), max_workers=1, client=client, path_cache=FilePathCache())
+        prefetcher.cache.put("cached", b"cached pdf")
+        
+        files = [("cached", "Physics 2021.pdf", ()), ("new", "Physics 2021", ()), ("broken", "Chemistry &amp; Biology", ())]
+        progress = []
+        zip_path, failures = build_zip_bundle(files, "token", prefetcher, progress=lambda done, total: progress.append(done))
+        try:
+            with zipfile.ZipFile(zip_path) as bundle:
+                names = bundle.namelist()
+                
+                # Test 1: Cached and downloaded files are bundled under unique, sanitized names
+                assert bundle.read("Physics 2021.pdf") == b"cached pdf"
+                assert bundle.read("Physics 2021 (2).pdf") == b'{"pdf": 2}'
+                assert all(info.compress_type == zipfile.ZIP_STORED for info in bundle.infolist())
+                print("  ✓ Files are bundled from the cache")
+                
+                # Test 2: Failures are reported without aborting the bundle
+                assert [name for name, _ in failures] == ["Chemistry & Biology.pdf"]
+                assert "Chemistry & Biology.pdf" not in names
+                assert "invalid file_id" in bundle.read("FAILED.txt").decode('utf-8')
+                assert progress[-1] == 3
+                print("  ✓ Failed files are listed in FAILED.txt")
+            
+            # Test 3: Abandoned bundles are swept by age
+            sweep_bundles()
+            assert os.path.exists(zip_path)
+            os.utime(zip_path, (0, 0))
+            sweep_bundles()
+            assert not os.path.exists(zip_path)
+            print("  ✓ Old bundles are swept")
+        finally:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+    
+    print("✅ ZIP bundle tests passed")
+
+
 def test_telegram_file_content():
     """Test Telegram file download logic (without actual API call)"""
     print("\nTesting Telegram download logic...")
     
-    # Test input validation
-    from app_fixed import get_telegram_file_content
-    
     # Test 1: Empty bot token
     content, error = get_telegram_file_content("test_id", "")
     assert content is None, "Should return None for empty token"
@@ -190,9 +1065,189 @@ def test_telegram_file_content():
     assert error is not None, "Should return error for empty file ID"
     print("  ✓ Empty file ID validation works")
     
+    # Test 3: Files over the cap fail before downloading
+    client = TelegramClient()
+    client.session = StubSession([
+        make_response(200, {"ok": True, "result": {"file_path": "documents/big.pdf", "file_size": 100}}),
+    ])
+    content, error = get_telegram_file_content("big", "token", client=client, path_cache=FilePathCache(), max_bytes=50)
+    assert content is None and "too large" in error
+    assert len(client.session.urls) == 1, "Oversized files should not be downloaded"
+    print("  ✓ Oversized files fail fast")
+    
+    # Test 4: Streams longer than the reported size are cut off
+    client.session = StubSession([
+        make_response(200, {"ok": True, "result": {"file_path": "documents/file.pdf", "file_size": 4}}),
+        make_response(200, {"pdf": 1}),
+    ])
+    content, error = get_telegram_file_content("short", "token", client=client, path_cache=FilePathCache())
+    assert content is None and "too large" in error
+    
+    # Test 5: fetch_pdf streams straight into the PDF cache
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PdfCache(directory)
+        client.session = StubSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/file.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 1}),
+        ])
+        assert fetch_pdf("file", "token", cache, client=client, path_cache=FilePathCache()) is None
+        assert cache.read("file") == b'{"pdf": 1}'
+        
+        # Test 6: A failed copy fails over to the paper's other file IDs
+        client.session = StubSession([
+            make_response(200, {"ok": False, "error_code": 400, "description": "Bad Request: wrong file_id"}),
+            make_response(200, {"ok": True, "result": {"file_path": "documents/copy.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 2}),
+        ])
+        error = fetch_pdf("bad", "token", cache, client=client, path_cache=FilePathCache(), fallback_ids=("copy",))
+        assert error is None and cache.read("bad") == b'{"pdf": 2}'
+        
+        # Test 7: A part file removed before it is committed is an error, not a crash
+        client.session = StubSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/gone.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 3}),
+        ])
+        commit = cache.commit
+        cache.commit = lambda file_id, temp_path: (os.remove(temp_path), commit(file_id, temp_path))[1]
+        error = fetch_pdf("gone", "token", cache, client=client, path_cache=FilePathCache())
+        cache.commit = commit
+        assert error.startswith("❌") and "gone" not in cache
+        
+        # Failed downloads leave nothing behind
+        assert fetch_pdf("missing", "", cache) is not None
+        assert "missing" not in cache
+        assert not [name for name in os.listdir(directory) if name.endswith('.part')]
+    print("  ✓ Downloads are streamed into the cache")
+    
     print("✅ Telegram download logic tests passed")
 
 
+def asgi_get(app, path, query="", headers=None):
+    """Send one GET request to an ASGI app and return (status, headers, body)."""
+    response = {}
+    requested = []
+    
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Streaming responses listen for a disconnect until they finish
+        await asyncio.Event().wait()
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+        else:
+            response["body"] = response.get("body", b"") + message.get("body", b"")
+    
+    asyncio.run(app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "server": ("test", 80), "client": ("test", 1),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+    }, receive, send))
+    return response["status"], response["headers"], response.get("body", b"")
+
+
+def test_api():
+    """Test the JSON search API"""
+    print("\nTesting JSON API...")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex(add_display_names(collapse_duplicates(pd.DataFrame({
+            "File Name": ["2021 AL Physics Sinhala.pdf", "2021 AL Physics Sinhala (1).pdf", "2019 AL Chemistry.pdf"],
+            "File ID": ["phys", "phys-copy", "chem"],
+        }))))
+        store = IndexStore(index, os.path.join(directory, "index.csv"), os.path.join(directory, "index.npz"))
+        client = TelegramClient()
+        client.session = StubSession([
+            make_response(200, {"ok": True, "result": {"file_path": "documents/phys.pdf", "file_size": 10}}),
+            make_response(200, {"pdf": 1}),
+            make_response(200, {"pdf": 1}),
+        ])
+        prefetcher = Prefetcher(PdfCache(os.path.join(directory, "pdfs")), client=client, path_cache=FilePathCache())
+        app = create_app(SearchService(store, "token", prefetcher=prefetcher))
+        
+        # Test 1: Search returns the app's ranking as JSON
+        status, headers, body = asgi_get(app, "/search", "q=physics+2021&limit=5")
+        results = json.loads(body)["results"]
+        assert status == 200 and [paper["id"] for paper in results] == ["phys"]
+        assert results[0]["fallback_ids"] == ["phys-copy"] and results[0]["url"] == "/file/phys"
+        assert index.version in headers["etag"] and "max-age" in headers["cache-control"]
+        assert asgi_get(app, "/search")[0] == 400
+        print("  ✓ Search results are served as JSON")
+        
+        # Test 2: A current ETag gets 304 Not Modified
+        status, _, body = asgi_get(app, "/search", "q=physics+2021&limit=5", {"If-None-Match": headers["etag"]})
+        assert status == 304 and body == b""
+        assert asgi_get(app, "/search", "q=physics+2021&limit=4", {"If-None-Match": headers["etag"]})[0] == 200
+        print("  ✓ ETags follow the index version and query")
+        
+        # Test 3: Files are downloaded once and served from the cache
+        status, headers, body = asgi_get(app, "/file/phys")
+        assert status == 200 and body == b'{"pdf": 1}' and headers["content-type"] == "application/pdf"
+        assert asgi_get(app, "/file/phys")[2] == body
+        assert len(client.session.urls) == 2
+        assert asgi_get(app, "/file/phys", headers={"If-None-Match": headers["etag"]})[0] == 304
+        assert asgi_get(app, "/file/unknown")[0] == 404
+        print("  ✓ Files are served from the PDF cache")
+        
+        # Test 4: A file evicted right after its fetch is fetched again
+        fetch = prefetcher.fetch
+        
+        def fetch_then_evict(file_id, *args):
+            error = fetch(file_id, *args)
+            prefetcher.fetch = fetch
+            os.remove(prefetcher.cache.path(file_id))
+            return error
+        
+        prefetcher.fetch = fetch_then_evict
+        status, headers, body = asgi_get(app, "/file/phys")
+        assert status == 200 and body == b'{"pdf": 1}' and headers["content-length"] == str(len(body))
+        assert len(client.session.urls) == 3
+        print("  ✓ Evicted files are fetched again")
+        
+        # Test 5: Shards are started in the background; searches run in-process until then
+        service = SearchService(store, "token", prefetcher=prefetcher, shards=2)
+        expected = service._search_body("physics 2021", 5, index)
+        for _ in range(100):
+            if service._sharded is not None:
+                break
+            time.sleep(0.1)
+        try:
+            assert service._sharded is not None and service._sharded.version == index.version
+            assert service._search_body("physics 2021", 5, index) == expected
+        finally:
+            service._sharded.close()
+        print("  ✓ Sharded search is swapped in once built")
+        
+        # Test 6: Shards that fail to start are not retried for the same index
+        starts = []
+        
+        def failing_shards(index, count):
+            starts.append(index.version)
+            raise OSError("spawn not permitted")
+        
+        sharded_search, api.ShardedSearch = api.ShardedSearch, failing_shards
+        try:
+            service = SearchService(store, "token", prefetcher=prefetcher, shards=2)
+            for _ in range(100):
+                assert service._search_body("physics 2021", 5, index) == expected
+                if service._failed is not None:
+                    break
+                time.sleep(0.01)
+            for _ in range(3):
+                assert service._search_body("physics 2021", 5, index) == expected
+            time.sleep(0.1)
+            assert starts == [index.version] and service._building is None
+        finally:
+            api.ShardedSearch = sharded_search
+        print("  ✓ Failed shards fall back to in-process search")
+    
+    print("✅ JSON API tests passed")
+
+
 def run_all_tests():
     """Run all tests"""
     print("=" * 60)
@@ -206,18 +1261,75 @@ def run_all_tests():
         # Test 2: Text normalization
         test_normalize_text()
         
-        # Test 3: CSV loading
+        # Test 3: Core imports
+        test_core_imports()
+        
+        # Test 4: CSV loading
         df = test_load_master_index()
         
-        # Test 4: Fuzzy search
+        # Test 5: Index snapshot
+        test_index_snapshot()
+        
+        # Test 6: Duplicate collapsing
+        test_collapse_duplicates()
+        
+        # Test 7: Index reload
+        test_index_reload()
+        
+        # Test 8: Fuzzy search
         test_fuzzy_search(df)
         
-        # Test 5: Data quality
+        # Test 9: Search features
+        test_search_features(df)
+        
+        # Test 10: Search index
+        test_search_index(df)
+        
+        # Test 11: Ranking order
+        test_ranking_order()
+        
+        # Test 12: Typo tolerance
+        test_typo_tolerance()
+        
+        # Test 13: Suggestions
+        test_suggestions()
+        
+        # Test 14: Facets
+        test_facets()
+        
+        # Test 15: Sharded search
+        test_sharded_search()
+        
+        # Test 16: Result cache
+        test_search_result_cache()
+        
+        # Test 17: Data quality
         test_csv_data_quality(df)
         
-        # Test 6: Telegram logic
+        # Test 18: PDF cache
+        test_pdf_cache()
+        
+        # Test 19: Telegram client
+        test_telegram_client()
+        
+        # Test 20: Request scheduler
+        test_request_scheduler()
+        
+        # Test 21: getFile cache
+        test_file_path_cache()
+        
+        # Test 22: Prefetcher
+        test_prefetcher()
+        
+        # Test 23: ZIP bundles
+        test_zip_bundle()
+        
+        # Test 24: Telegram logic
         test_telegram_file_content()
         
+        # Test 25: JSON API
+        test_api()
+        
         print("\n" + "=" * 60)
         print("✅ ALL TESTS PASSED!")
         print("=" * 60)